@@ -6,6 +6,7 @@ class BasketConfig(AppConfig):
     name = 'Basket'
 
     def ready(self):
+        import Basket.signals
         from .consumer import start_consumer
         start_consumer()
 
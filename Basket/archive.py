@@ -0,0 +1,64 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Basket, BasketArchive, BasketItem, BasketItemArchive
+
+logger = logging.getLogger(__name__)
+
+BASKET_FIELDS = [field.attname for field in BasketArchive._meta.concrete_fields if field.attname != 'archived_at']
+ITEM_FIELDS = [field.attname for field in BasketItemArchive._meta.concrete_fields]
+
+
+def archive_baskets(older_than_days=30, batch_size=1000):
+    """
+    Переносит корзины, неактивные дольше older_than_days дней (по deactivated_at), вместе
+    с позициями в BasketArchive / BasketItemArchive, по batch_size корзин за транзакцию. В горячей таблице остаются живые корзины.
+    Повторный запуск безопасен: уже перенесённые строки пропускаются (ignore_conflicts).
+    Возвращает число перенесённых корзин.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    archived = 0
+    while True:
+        basket_ids = list(
+            Basket.objects.filter(is_active=False, deactivated_at__lt=cutoff)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not basket_ids:
+            break
+
+        with transaction.atomic():
+            baskets = Basket.objects.filter(id__in=basket_ids, is_active=False).values(*BASKET_FIELDS)
+            BasketArchive.objects.bulk_create(
+                [BasketArchive(**row) for row in baskets], ignore_conflicts=True)
+            items = BasketItem.objects.filter(cart_id__in=basket_ids).values(*ITEM_FIELDS)
+            BasketItemArchive.objects.bulk_create(
+                [BasketItemArchive(**row) for row in items], ignore_conflicts=True, batch_size=batch_size)
+
+            BasketItem.objects.filter(cart_id__in=basket_ids).delete()
+            Basket.objects.filter(id__in=basket_ids, is_active=False).delete()
+
+        archived += len(basket_ids)
+        logger.debug("Перенесено в архив %s корзин, всего %s", len(basket_ids), archived)
+    return archived
+
+
+def run_archiver(interval, older_than_days=30, batch_size=1000):
+    """
+    Архивация раз в interval секунд в текущем процессе, без возврата. Запускается отдельным
+    воркером (archive_baskets --loop), а не в веб-процессах: иначе каждый воркер сервера
+    приложений гонял бы свою копию.
+    """
+    while True:
+        try:
+            archived = archive_baskets(older_than_days, batch_size)
+            if archived:
+                logger.info("Архивация корзин: перенесено %s", archived)
+        except Exception as e:
+            logger.error("Ошибка архивации корзин: %s", e)
+        finally:
+            close_old_connections()
+        time.sleep(interval)
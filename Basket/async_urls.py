@@ -0,0 +1,9 @@
+from django.urls import path
+
+from Basket import async_views
+
+urlpatterns = [
+    path('', async_views.create_basket, name='basket-async-create'),
+    path('<uuid:basket_pk>/items/', async_views.basket_items, name='basket-async-items'),
+    path('<uuid:basket_pk>/items/<int:pk>/', async_views.basket_item, name='basket-async-item'),
+]
@@ -0,0 +1,157 @@
+"""
+ASGI-версия основных эндпоинтов корзины: создание корзины, список позиций, добавление
+товара и изменение количества. Пока запрос ждёт БД или сервис покупателей, event loop
+обслуживает другие запросы. Ответы совпадают с BasketViewSet / BasketItemViewSet.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework.utils.encoders import JSONEncoder
+
+from .customer_client import CUSTOMER_CLIENT, CustomerServiceUnavailable
+from .models import Basket, BasketItem
+from .product_cache import PRODUCT_CACHE
+from .queries import abasket_items_with_stock, apply_quantity_deltas
+from .serializers import BasketItemSerializer, BasketSerializer, basket_item_rows, basket_items_data
+from .totals import basket_totals_transaction
+
+
+def json_response(data, status=200):
+    # Кодировщик DRF: Decimal уходит числом, как в ответах вьюсетов (COERCE_DECIMAL_TO_STRING=False)
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def parse_body(request):
+    """JSON-объект из тела запроса; None, если тело не JSON или не объект (список, число, строка)."""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# Изменения позиций идут в потоке: transaction.atomic в async-контексте недоступен,
+# а позиции и итоги корзины должны меняться в одной транзакции
+
+@sync_to_async
+def create_item(basket, data):
+    with basket_totals_transaction([basket.id]):
+        return BasketItem.objects.create(**data, cart=basket)
+
+
+@sync_to_async
+def change_quantity(basket_pk, pk, delta):
+    with basket_totals_transaction([basket_pk]):
+        return apply_quantity_deltas(basket_pk, {pk: delta})
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def create_basket(request):
+    data = parse_body(request)
+    if data is None:
+        return json_response({"error": "Expected a JSON object"}, status=400)
+
+    serializer = BasketSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=400)
+    store_id = serializer.validated_data.get("store_id")
+
+    user = await request.auser()
+    if user.is_authenticated:
+        customer_id = user.id
+        session_id = None
+    else:
+        session_id = request.headers.get('session')
+        customer_id = None
+        if not session_id:
+            return json_response({"error": {"session": "Session ID is required for anonymous users"}}, status=400)
+
+    if customer_id:
+        try:
+            verified = await CUSTOMER_CLIENT.averify(customer_id)
+        except CustomerServiceUnavailable as e:
+            return json_response({"error": str(e)}, status=503)
+        if not verified:
+            return json_response({"error": {"customer": "Customer was not found or blocked"}}, status=400)
+
+    basket, created = await Basket.objects.aget_or_create(
+        customer_id=customer_id,
+        session_id=session_id,
+        store_id=store_id,
+        is_active=True,
+    )
+    return json_response(BasketSerializer(basket).data, status=201 if created else 200)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def basket_items(request, basket_pk):
+    if request.method == 'POST':
+        return await add_item(request, basket_pk)
+
+    items = await abasket_items_with_stock(basket_pk)
+    if not items:
+        return json_response({"error": "Basket not found"}, status=404)
+
+    if any(item.stock_quantity is None for item in items):
+        return json_response({"error": "No stock data available for basket items"}, status=400)
+
+    return json_response(basket_items_data(items))
+
+
+async def add_item(request, basket_pk):
+    data = parse_body(request)
+    if data is None:
+        return json_response({"error": "Expected a JSON object"}, status=400)
+
+    serializer = BasketItemSerializer(data=data)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=400)
+    validated_data = serializer.validated_data
+
+    basket = await Basket.objects.filter(id=basket_pk).afirst()
+    if basket is None:
+        return json_response({"detail": "Basket was not found"}, status=404)
+
+    product_id = validated_data.get("product_id")
+    store_data = await sync_to_async(PRODUCT_CACHE.get)(basket.store_id, product_id)
+    if not store_data or not store_data.get('quantity', None):
+        return json_response({"detail": {"store_product": "Product was not found or has empty quantity"}}, status=400)
+
+    try:
+        item = await create_item(basket, {**validated_data, 'sku': store_data['sku']})
+    except IntegrityError:
+        return json_response({"detail": {"product_id": "Product is already in the basket"}}, status=400)
+
+    data = BasketItemSerializer(item, context={'price_data': {product_id: store_data}}).data
+    return json_response(data, status=201)
+
+
+@csrf_exempt
+@require_http_methods(['PUT', 'PATCH'])
+async def basket_item(request, basket_pk, pk):
+    """Изменяет количество на delta (+1 или -1); при quantity <= 0 позиция удаляется."""
+    data = parse_body(request)
+    if data is None:
+        return json_response({"error": "Expected a JSON object"}, status=400)
+
+    delta = data.get('delta', 0)
+    if delta not in [-1, 1]:
+        return json_response({"detail": {"delta": "Delta must be +1 or -1"}}, status=400)
+
+    items, deleted, missing = await change_quantity(basket_pk, pk, delta)
+    if deleted:
+        return HttpResponse(status=204)
+    if missing:
+        return json_response({"detail": "Item was not found or the product is not sold in the store"}, status=404)
+
+    response_data = basket_item_rows(items)[0]
+    item = items[0]
+    if delta > 0 and item.quantity >= item.stock_quantity:
+        response_data['message'] = [f"You have {item.stock_quantity} items remaining."]
+    return json_response(response_data)
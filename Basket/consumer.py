@@ -3,7 +3,9 @@ import logging
 import pprint
 import threading
 import pika
+from django.utils import timezone
 from .models import SyncedDataFromProduct, Basket
+from .repricing import product_data_changed
 
 RabbitUser = "user"
 RabbitPassword = "password"
@@ -13,7 +15,7 @@ logging.basicConfig(level=logging.INFO)
 
 def inactiveTheBasket(basket_id):
 
-    Basket.objects.filter(id=basket_id).update(is_active=False)
+    Basket.objects.filter(id=basket_id, is_active=True).update(is_active=False, deactivated_at=timezone.now())
 
 
 
@@ -33,6 +35,18 @@ def callback_from_order(ch, method, properties, body):
     ch.basic_ack(delivery_tag=method.delivery_tag)
 
 
+def callback_from_product_data(ch, method, properties, body):
+    # Писатель SyncedDataFromProduct после коммита сообщает {"store_id": ..., "product_ids": [...]}
+    data = json.loads(body)
+    logging.info("Received product data change: %r" % data)
+    try:
+        basket_ids = product_data_changed(data['store_id'], data['product_ids'])
+        logging.info('Product data change applied to %s baskets' % len(basket_ids))
+    except Exception as err:
+        logging.error(f"Error processing product data message: {err}")
+    ch.basic_ack(delivery_tag=method.delivery_tag)
+
+
 def consume_from_rabbitmq(queue, callback):
     connection = pika.BlockingConnection(pika.ConnectionParameters(
         host='rabbit-container',
@@ -48,7 +62,8 @@ def consume_from_rabbitmq(queue, callback):
 
 def start_consumer():
     queues = {
-        'BasketIsOrdered': callback_from_order
+        'BasketIsOrdered': callback_from_order,
+        'ProductDataChanged': callback_from_product_data,
     }
 
     threads = [
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import threading
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .sourcesUrls import customer
+
+try:
+    import httpx
+except ImportError:  # httpx не обязателен, без него averify уходит в поток с requests
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'URL': customer,
+    'CONNECT_TIMEOUT': 0.5,
+    'READ_TIMEOUT': 2.0,
+    'POOL_SIZE': 20,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+    'CACHE_TTL': 60,
+}
+
+
+class CustomerServiceUnavailable(Exception):
+    """Сервис покупателей не ответил вовремя, ответил 5xx или автомат разомкнут."""
+
+
+class CircuitBreaker:
+    """
+    Автомат: после failure_threshold сбоев подряд запросы не отправляются reset_timeout секунд.
+    Затем пропускается один пробный запрос: успех замыкает автомат, сбой снова размыкает.
+    Место пробного запроса освобождает release() — только тот вызов, которому acquire() его отдал.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def acquire(self):
+        """(allowed, trial): можно ли отправить запрос и занял ли он место пробного запроса."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True, False
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True, True
+            return False, False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Сервис покупателей недоступен: %s сбоев подряд, автомат разомкнут", self.failures)
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Освобождает место пробного запроса; вызывается тем, кто его занял, при любом исходе."""
+        with self._lock:
+            self.trial_in_flight = False
+
+
+class TTLCache:
+    """Множество ключей, каждый из которых живёт ttl секунд."""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            expires_at = self._expires.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= time.monotonic():
+                del self._expires[key]
+                return False
+            return True
+
+    def add(self, key):
+        with self._lock:
+            self._expires[key] = time.monotonic() + self.ttl
+            # Протухшие ключи чистим при записи, чтобы словарь не рос бесконечно
+            if len(self._expires) > 10000:
+                now = time.monotonic()
+                self._expires = {k: v for k, v in self._expires.items() if v > now}
+
+    def discard(self, key):
+        with self._lock:
+            self._expires.pop(key, None)
+
+
+class CustomerClient:
+    """
+    Клиент сервиса покупателей: пул keep-alive соединений, жёсткие таймауты, автомат
+    и кэш подтверждённых покупателей на cache_ttl секунд (отказы не кэшируются).
+    Соединения httpx.AsyncClient привязаны к event loop'у, поэтому асинхронный клиент свой
+    у каждого loop'а (async_client) и закрывается вместе с ним.
+    """
+
+    def __init__(self, base_url=customer, connect_timeout=0.5, read_timeout=2.0, pool_size=20,
+                 failure_threshold=5, reset_timeout=30, cache_ttl=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.verified = TTLCache(cache_ttl)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._async_clients = {}
+        # Ссылки на задачи закрытия: loop хранит задачи только слабыми ссылками
+        self._closers = set()
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULTS, **getattr(settings, 'CUSTOMER_SERVICE', {})}
+        return cls(
+            base_url=config['URL'],
+            connect_timeout=config['CONNECT_TIMEOUT'],
+            read_timeout=config['READ_TIMEOUT'],
+            pool_size=config['POOL_SIZE'],
+            failure_threshold=config['FAILURE_THRESHOLD'],
+            reset_timeout=config['RESET_TIMEOUT'],
+            cache_ttl=config['CACHE_TTL'],
+        )
+
+    def _url(self, customer_id):
+        return f"{self.base_url}/customer/{customer_id}"
+
+    def _acquire(self):
+        """Занимает разрешение автомата; True, если это пробный запрос. Исключение, если автомат разомкнут."""
+        allowed, trial = self.breaker.acquire()
+        if not allowed:
+            raise CustomerServiceUnavailable("Customer service is temporarily unavailable")
+        return trial
+
+    def _handle_status(self, customer_id, status_code):
+        if status_code >= 500:
+            self.breaker.failure()
+            raise CustomerServiceUnavailable(f"Customer service responded with {status_code}")
+        self.breaker.success()
+        if status_code == 200:
+            self.verified.add(str(customer_id))
+            return True
+        return False
+
+    def _handle_error(self, customer_id, error):
+        self.breaker.failure()
+        logger.warning("Ошибка запроса к сервису покупателей для %s: %s", customer_id, error)
+        raise CustomerServiceUnavailable("Customer service is temporarily unavailable") from error
+
+    def verify(self, customer_id):
+        """True — покупатель найден и активен, False — не найден или заблокирован."""
+        if str(customer_id) in self.verified:
+            return True
+        trial = self._acquire()
+        try:
+            try:
+                response = self.session.get(self._url(customer_id), timeout=self.timeout)
+            except requests.RequestException as e:
+                self._handle_error(customer_id, e)
+            return self._handle_status(customer_id, response.status_code)
+        finally:
+            if trial:
+                self.breaker.release()
+
+    async def averify(self, customer_id):
+        """Асинхронный verify для ASGI: httpx, если установлен, иначе verify в отдельном потоке."""
+        if httpx is None:
+            return await sync_to_async(self.verify, thread_sensitive=False)(customer_id)
+
+        if str(customer_id) in self.verified:
+            return True
+        trial = self._acquire()
+        try:
+            try:
+                response = await self.async_client.get(self._url(customer_id))
+            except httpx.HTTPError as e:
+                self._handle_error(customer_id, e)
+            return self._handle_status(customer_id, response.status_code)
+        finally:
+            if trial:
+                self.breaker.release()
+
+    @property
+    def async_client(self):
+        """AsyncClient текущего event loop'а: keep-alive соединения другого loop'а здесь непригодны."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            connect_timeout, read_timeout = self.timeout
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+            self._async_clients[loop] = client
+            closer = loop.create_task(self._close_with_loop(loop, client))
+            self._closers.add(closer)
+            closer.add_done_callback(self._closers.discard)
+        return client
+
+    async def _close_with_loop(self, loop, client):
+        # asyncio.run и asgiref перед закрытием loop'а отменяют незавершённые задачи:
+        # отмена этой задачи и есть сигнал закрыть клиент
+        try:
+            await loop.create_future()
+        finally:
+            self._async_clients.pop(loop, None)
+            await client.aclose()
+
+    def close(self):
+        self.session.close()
+
+
+CUSTOMER_CLIENT = CustomerClient.from_settings()
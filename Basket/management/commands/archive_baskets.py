@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Basket.archive import archive_baskets, run_archiver
+
+
+class Command(BaseCommand):
+    help = ("Переносит неактивные корзины и их позиции в архивные таблицы: разово (для cron) "
+            "или с --loop раз в BASKET_ARCHIVE['INTERVAL'] секунд как отдельный воркер")
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'BASKET_ARCHIVE', {})
+        parser.add_argument('--days', type=int, default=config.get('AFTER_DAYS', 30),
+                            help="Архивировать корзины, неактивные дольше стольких дней")
+        parser.add_argument('--batch-size', type=int, default=config.get('BATCH_SIZE', 1000),
+                            help="Корзин за одну транзакцию")
+        parser.add_argument('--loop', action='store_true', help="Не завершаться, повторять раз в --interval секунд")
+        parser.add_argument('--interval', type=int, default=config.get('INTERVAL'),
+                            help="Пауза между запусками в режиме --loop, секунд")
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            if not options['interval']:
+                raise CommandError("--loop requires --interval or BASKET_ARCHIVE['INTERVAL']")
+            run_archiver(options['interval'], options['days'], options['batch_size'])
+            return
+        archived = archive_baskets(options['days'], options['batch_size'])
+        self.stdout.write(f"archived baskets: {archived}")
@@ -0,0 +1,82 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Basket.models import Basket
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark поиска корзины из BasketViewSet.create на большой истории: при --populate "
+        "заполняет Basket неактивными корзинами, затем меряет поиск активной корзины и печатает EXPLAIN. "
+        "Запускать на тестовой БД (SQLite или MySQL), не на боевой"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--populate', action='store_true', help="Сначала вставить --rows неактивных корзин")
+        parser.add_argument('--rows', type=int, default=10_000_000, help="Сколько неактивных корзин вставить")
+        parser.add_argument('--customers', type=int, default=1_000_000, help="Число разных покупателей")
+        parser.add_argument('--stores', type=int, default=50, help="Число магазинов")
+        parser.add_argument('--batch-size', type=int, default=50_000, help="Строк на один INSERT")
+        parser.add_argument('--lookups', type=int, default=1000, help="Сколько поисков выполнить")
+
+    def handle(self, *args, **options):
+        customers, stores = options['customers'], options['stores']
+        if options['populate']:
+            self.populate(options['rows'], customers, stores, options['batch_size'])
+
+        lookups = [
+            (str(random.randrange(customers)), random.randrange(1, stores + 1))
+            for _ in range(options['lookups'])
+        ]
+        # Часть поисков должна находить активную корзину, как в реальном трафике
+        Basket.objects.bulk_create(
+            [Basket(customer_id=customer_id, store_id=store_id, is_active=True)
+             for customer_id, store_id in lookups[::2]],
+            batch_size=options['batch_size'],
+        )
+
+        def lookup(customer_id, store_id):
+            return Basket.objects.filter(
+                customer_id=customer_id, session_id=None, store_id=store_id, is_active=True
+            ).first()
+
+        customer_id, store_id = lookups[0]
+        self.stdout.write(
+            Basket.objects.filter(customer_id=customer_id, session_id=None, store_id=store_id, is_active=True).explain()
+        )
+
+        started = time.perf_counter()
+        found = sum(1 for customer_id, store_id in lookups if lookup(customer_id, store_id) is not None)
+        elapsed = time.perf_counter() - started
+
+        total = Basket.objects.count()
+        self.stdout.write(
+            f"rows: {total:,}, lookups: {len(lookups)}, found: {found}, "
+            f"avg {elapsed * 1000 / len(lookups):.3f} ms/lookup"
+        )
+
+    def populate(self, rows, customers, stores, batch_size):
+        started = time.perf_counter()
+        inserted = 0
+        while inserted < rows:
+            size = min(batch_size, rows - inserted)
+            with transaction.atomic():
+                Basket.objects.bulk_create([
+                    Basket(
+                        id=uuid.uuid4(),
+                        customer_id=str(random.randrange(customers)) if random.random() < 0.7 else None,
+                        session_id=None if random.random() < 0.7 else uuid.uuid4().hex,
+                        store_id=random.randrange(1, stores + 1),
+                        is_active=False,
+                        deactivated_at=timezone.now(),
+                    )
+                    for _ in range(size)
+                ])
+            inserted += size
+            self.stdout.write(f"inserted {inserted:,}/{rows:,}", ending='\r')
+        self.stdout.write(f"\ninserted {rows:,} rows in {time.perf_counter() - started:.1f} s")
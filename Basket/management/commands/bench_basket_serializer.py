@@ -0,0 +1,63 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from Basket.models import BasketItem
+from Basket.serializers import BasketItemSerializer
+
+
+class LegacyBasketItemSerializer(BasketItemSerializer):
+    """Прежний поиск цены перебором списка — только для сравнения."""
+
+    def get_total_item_price(self, obj):
+        price_data = self.context['price_data']
+        product_info = next((product for product in price_data if product['product_id'] == obj.product_id), None)
+        if not product_info:
+            return 'Undefined'
+        return obj.quantity * (product_info['price'] * (1 - product_info['discount'] / 100))
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark: сериализация корзины с поиском цены перебором списка против словаря по product_id"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help="Размеры корзин")
+        parser.add_argument('--repeat', type=int, default=20, help="Сколько раз сериализовать каждую корзину")
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+
+        for size in options['sizes']:
+            # Объекты не сохраняются: меряем только сериализацию, без БД
+            items = [
+                BasketItem(id=index, quantity=index % 5 + 1, product_id=index, sku=f"SKU-{index}")
+                for index in range(1, size + 1)
+            ]
+            rows = [
+                {'product_id': index, 'price': Decimal('1000.00') + index, 'discount': Decimal(index % 30)}
+                for index in range(1, size + 1)
+            ]
+            price_map = {row['product_id']: row for row in rows}
+
+            results = {}
+            for name, serializer_class, price_data in [
+                ('legacy', LegacyBasketItemSerializer, rows),
+                ('dict', BasketItemSerializer, price_map),
+            ]:
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    data = serializer_class(items, many=True, context={'price_data': price_data}).data
+                results[name] = (time.perf_counter() - started, data)
+
+            legacy_elapsed, legacy_data = results['legacy']
+            dict_elapsed, dict_data = results['dict']
+            mismatches = sum(
+                1 for old, new in zip(legacy_data, dict_data)
+                if old['total_item_price'] != new['total_item_price']
+            )
+            self.stdout.write(
+                f"{size:>5} items: legacy {legacy_elapsed * 1000 / repeat:.2f} ms, "
+                f"dict {dict_elapsed * 1000 / repeat:.2f} ms, "
+                f"speedup {legacy_elapsed / dict_elapsed:.2f}x, mismatches: {mismatches}"
+            )
@@ -0,0 +1,65 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from Shop.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочное сравнение WSGI и ASGI путей корзины: N параллельных GET списка позиций. "
+        "Пример: loadtest_basket <basket_id> --wsgi-url http://localhost:8000/cart "
+        "--asgi-url http://localhost:8001/async/cart"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('basket', help="ID существующей корзины")
+        parser.add_argument('--wsgi-url', default='http://localhost:8000/cart', help="Префикс DRF-эндпоинтов (WSGI)")
+        parser.add_argument('--asgi-url', default='http://localhost:8001/async/cart', help="Префикс async-эндпоинтов (ASGI)")
+        parser.add_argument('--requests', type=int, default=1000, help="Запросов на каждый путь")
+        parser.add_argument('--concurrency', type=int, default=50, help="Параллельных клиентов")
+        parser.add_argument('--timeout', type=float, default=10.0, help="Таймаут запроса, секунд")
+
+    def handle(self, *args, **options):
+        for name in ['wsgi', 'asgi']:
+            url = f"{options[f'{name}_url'].rstrip('/')}/{options['basket']}/items/"
+            latencies, errors, elapsed = self.run(url, options['requests'], options['concurrency'], options['timeout'])
+            self.report(name, latencies, errors, elapsed)
+
+    def run(self, url, total, concurrency, timeout):
+        # Своя сессия на поток: keep-alive, как у реального клиента
+        local = threading.local()
+
+        def call(_):
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = local.session = requests.Session()
+            started = time.perf_counter()
+            try:
+                ok = session.get(url, timeout=timeout).status_code == 200
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(call, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, ok in results if ok)
+        errors = sum(1 for _, ok in results if not ok)
+        return latencies, errors, elapsed
+
+    def report(self, name, latencies, errors, elapsed):
+        if not latencies:
+            self.stdout.write(f"{name}: все {errors} запросов завершились ошибкой")
+            return
+
+        self.stdout.write(
+            f"{name}: {len(latencies) / elapsed:,.0f} req/s, "
+            f"p50 {percentile(latencies, 50) * 1000:.1f} ms, "
+            f"p95 {percentile(latencies, 95) * 1000:.1f} ms, p99 {percentile(latencies, 99) * 1000:.1f} ms, errors: {errors}"
+        )
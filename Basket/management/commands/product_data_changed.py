@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from Basket.repricing import product_data_changed
+
+
+class Command(BaseCommand):
+    help = ("Сообщает корзине, что цены, скидки или остатки товаров магазина изменились: урезает "
+            "позиции активных корзин до остатка и пересчитывает их итоги. Вызывается писателем "
+            "SyncedDataFromProduct после коммита, если он не может отправить сообщение в ProductDataChanged")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, required=True, help="id магазина")
+        parser.add_argument('product_ids', nargs='+', type=int, help="id изменившихся товаров")
+
+    def handle(self, *args, **options):
+        basket_ids = product_data_changed(options['store'], options['product_ids'])
+        self.stdout.write(f"baskets updated: {len(basket_ids)}")
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Basket', '0009_basket_basket_type_basket_customer_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basket',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='basket',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='basket',
+            name='discount_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='basket',
+            name='grand_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+    ]
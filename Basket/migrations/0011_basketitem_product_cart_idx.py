@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Basket', '0010_basket_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='basketitem',
+            index=models.Index(fields=['product_id', 'cart'], name='basketitem_product_cart_idx'),
+        ),
+    ]
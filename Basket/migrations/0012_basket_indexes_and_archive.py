@@ -0,0 +1,56 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Basket', '0011_basketitem_product_cart_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='basket',
+            index=models.Index(fields=['customer_id', 'store_id', 'is_active'], name='basket_customer_store_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='basket',
+            index=models.Index(fields=['session_id', 'store_id', 'is_active'], name='basket_session_store_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='basket',
+            index=models.Index(fields=['is_active', 'created_at'], name='basket_active_created_idx'),
+        ),
+        migrations.CreateModel(
+            name='BasketArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('customer_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('session_id', models.CharField(blank=True, max_length=50, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('store_id', models.PositiveIntegerField()),
+                ('basket_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('customer_latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('customer_longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('customer_address', models.TextField(blank=True, null=True)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('discount_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('grand_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_id', 'created_at'], name='basketarchive_customer_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BasketItemArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('product_id', models.IntegerField()),
+                ('sku', models.CharField(max_length=100)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='Basket.basketarchive')),
+            ],
+        ),
+    ]
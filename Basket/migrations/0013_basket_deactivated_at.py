@@ -0,0 +1,37 @@
+from django.db import migrations, models
+from django.db.models.functions import Now
+
+
+def backfill_deactivated_at(apps, schema_editor):
+    # Когда деактивированы уже неактивные корзины, неизвестно: срок до архивации отсчитываем от миграции
+    Basket = apps.get_model('Basket', 'Basket')
+    Basket.objects.filter(is_active=False, deactivated_at__isnull=True).update(deactivated_at=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Basket', '0012_basket_indexes_and_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basket',
+            name='deactivated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='basketarchive',
+            name='deactivated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RemoveIndex(
+            model_name='basket',
+            name='basket_active_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='basket',
+            index=models.Index(fields=['is_active', 'deactivated_at'], name='basket_active_deactivated_idx'),
+        ),
+        migrations.RunPython(backfill_deactivated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_totals(apps, schema_editor):
+    # Итоги, добавленные в 0010 со значением 0, пересчитываем для живых корзин тем же кодом,
+    # что и при изменении позиций
+    from Basket.totals import refresh_basket_totals
+
+    Basket = apps.get_model('Basket', 'Basket')
+    last_id = None
+    while True:
+        baskets = Basket.objects.filter(is_active=True).order_by('id')
+        if last_id is not None:
+            baskets = baskets.filter(id__gt=last_id)
+        basket_ids = list(baskets.values_list('id', flat=True)[:BATCH_SIZE])
+        if not basket_ids:
+            break
+        refresh_basket_totals(basket_ids)
+        last_id = basket_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Basket', '0013_basket_deactivated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
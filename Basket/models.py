@@ -18,11 +18,28 @@ class Basket(models.Model):
     session_id = models.CharField(null=True, blank=True, max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True) # type: ignore
+    # Когда корзина стала неактивной: от этого момента считается срок до архивации
+    deactivated_at = models.DateTimeField(null=True, blank=True)
     store_id = models.PositiveIntegerField(null=False)
     basket_type = models.CharField(null=True, blank=True, max_length=50)
     customer_latitude = models.DecimalField(null=True, blank=True, max_digits=10, decimal_places=8)
     customer_longitude = models.DecimalField(null=True, blank=True, max_digits=10, decimal_places=8)
     customer_address = models.TextField(null=True, blank=True)
+    # Денормализованные итоги: пересчитываются при изменении позиций и цен (Basket/totals.py)
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    grand_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Поиск корзины в BasketViewSet.create: покупатель или сессия + магазин + активность.
+            # Частичные индексы (WHERE is_active) MySQL не поддерживает, поэтому is_active — в ключе
+            models.Index(fields=['customer_id', 'store_id', 'is_active'], name='basket_customer_store_idx'),
+            models.Index(fields=['session_id', 'store_id', 'is_active'], name='basket_session_store_idx'),
+            # Отбор неактивных корзин для архивации (Basket/archive.py)
+            models.Index(fields=['is_active', 'deactivated_at'], name='basket_active_deactivated_idx'),
+        ]
 
 
 
@@ -39,6 +56,10 @@ class BasketItem(models.Model):
 
     class Meta:
         unique_together = ('cart', 'product_id')
+        indexes = [
+            # Обратный индекс товар -> корзины для урезания и пересчёта при изменении цен и остатков
+            models.Index(fields=['product_id', 'cart'], name='basketitem_product_cart_idx'),
+        ]
 
 
 
@@ -54,3 +75,38 @@ class SyncedDataFromProduct(models.Model):
     class Meta:
         unique_together = ('store_id', 'product_id')
 
+
+
+
+class BasketArchive(models.Model):
+    """Неактивные корзины, вынесенные из Basket архивацией; id совпадает с исходным."""
+    id = models.UUIDField(primary_key=True, editable=False)
+    customer_id = models.CharField(null=True, blank=True, max_length=50)
+    session_id = models.CharField(null=True, blank=True, max_length=50)
+    created_at = models.DateTimeField()
+    deactivated_at = models.DateTimeField(null=True, blank=True)
+    store_id = models.PositiveIntegerField(null=False)
+    basket_type = models.CharField(null=True, blank=True, max_length=50)
+    customer_latitude = models.DecimalField(null=True, blank=True, max_digits=10, decimal_places=8)
+    customer_longitude = models.DecimalField(null=True, blank=True, max_digits=10, decimal_places=8)
+    customer_address = models.TextField(null=True, blank=True)
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    grand_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_id', 'created_at'], name='basketarchive_customer_idx'),
+        ]
+
+
+
+
+class BasketItemArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    cart = models.ForeignKey(BasketArchive, on_delete=models.CASCADE, related_name='items')
+    quantity = models.PositiveIntegerField(default=1)
+    product_id = models.IntegerField(null=False, blank=False)
+    sku = models.CharField(null=False, blank=False, max_length=100)
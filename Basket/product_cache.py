@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from Shop.metrics import REGISTRY, Counter
+from .models import SyncedDataFromProduct
+
+FIELDS = ('product_id', 'sku', 'price', 'discount', 'quantity')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'LOCAL_SIZE': 10000,
+    'LOCAL_TTL': 5,
+    'SHARED_ALIAS': None,
+    'SHARED_TTL': 5,
+}
+
+# Бэкенды, которые живут в памяти одного процесса: общим уровнем они не являются
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'basket_product_cache_requests_total', "Обращения к кэшу цен и остатков корзины", ['tier', 'result']))
+
+
+class ProductDataCache:
+    """
+    Кэш (store_id, product_id) -> {product_id, sku, price, discount, quantity} перед SyncedDataFromProduct.
+    Два уровня: LRU в памяти процесса и необязательный общий кэш Django (shared_alias).
+    SyncedDataFromProduct пишут снаружи, без сигналов: invalidate() вызывает product_data_changed
+    (Basket/repricing.py), которую писатель дёргает после коммита. Для писателей, которые её не
+    вызывают, устаревание ограничивает local_ttl: запись общего уровня помнит время загрузки из БД
+    и в LRU доживает лишь остаток local_ttl, а shared_ttl не больше local_ttl.
+    """
+
+    def __init__(self, enabled=True, local_size=10000, local_ttl=5, shared_alias=None, shared_ttl=300):
+        self.enabled = enabled
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.shared_alias = shared_alias
+        self.shared_ttl = min(shared_ttl, local_ttl)
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULTS, **getattr(settings, 'BASKET_PRODUCT_CACHE', {})}
+        shared_alias = config['SHARED_ALIAS']
+        # Без настоящего общего бэкенда второй уровень только добавил бы устаревания
+        if shared_alias and settings.CACHES.get(shared_alias, {}).get('BACKEND') in PROCESS_LOCAL_BACKENDS:
+            shared_alias = None
+        return cls(
+            enabled=config['ENABLED'],
+            local_size=config['LOCAL_SIZE'],
+            local_ttl=config['LOCAL_TTL'],
+            shared_alias=shared_alias,
+            shared_ttl=config['SHARED_TTL'],
+        )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    @staticmethod
+    def _shared_key(store_id, product_id):
+        return f"basket:product:{store_id}:{product_id}"
+
+    def get(self, store_id, product_id):
+        return self.get_many(store_id, [product_id]).get(product_id)
+
+    def get_many(self, store_id, product_ids):
+        """
+        Данные товаров магазина: {product_id: row}. Товаров, которых нет в SyncedDataFromProduct,
+        в ответе нет; отсутствие не кэшируется.
+        """
+        product_ids = set(product_ids)
+        if not self.enabled or not product_ids:
+            return self._load(store_id, product_ids)
+
+        result = self._get_local(store_id, product_ids)
+        CACHE_REQUESTS.inc(len(result), tier='local', result='hit')
+
+        missing = product_ids - result.keys()
+        shared = self.shared
+        if missing and shared is not None:
+            keys = {self._shared_key(store_id, product_id): product_id for product_id in missing}
+            entries = {keys[key]: entry for key, entry in shared.get_many(list(keys)).items()}
+            found = {product_id: row for product_id, (row, _) in entries.items()}
+            for product_id, (row, loaded_at) in entries.items():
+                self._set_local(store_id, {product_id: row}, loaded_at)
+            result.update(found)
+            self.shared_hits += len(found)
+            CACHE_REQUESTS.inc(len(found), tier='shared', result='hit')
+            missing -= found.keys()
+
+        if missing:
+            self.misses += len(missing)
+            CACHE_REQUESTS.inc(len(missing), tier='db', result='miss')
+            loaded_at = time.time()
+            loaded = self._load(store_id, missing)
+            self._set_local(store_id, loaded, loaded_at)
+            if shared is not None and loaded:
+                shared.set_many(
+                    {self._shared_key(store_id, product_id): (row, loaded_at) for product_id, row in loaded.items()},
+                    timeout=self.shared_ttl,
+                )
+            result.update(loaded)
+        return result
+
+    def invalidate(self, store_id, product_ids):
+        """Сбрасывает записи в обоих уровнях; вызывать после коммита изменения строк."""
+        product_ids = list(product_ids)
+        with self._lock:
+            for product_id in product_ids:
+                self._local.pop((store_id, product_id), None)
+        shared = self.shared
+        if shared is not None:
+            shared.delete_many([self._shared_key(store_id, product_id) for product_id in product_ids])
+        self.invalidations += len(product_ids)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _get_local(self, store_id, product_ids):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for product_id in product_ids:
+                key = (store_id, product_id)
+                entry = self._local.get(key)
+                if entry is None:
+                    continue
+                row, expires_at = entry
+                if expires_at <= now:
+                    del self._local[key]
+                    continue
+                self._local.move_to_end(key)
+                found[product_id] = row
+        self.local_hits += len(found)
+        return found
+
+    def _set_local(self, store_id, rows, loaded_at):
+        # Срок считается от загрузки строки из БД, а не от попадания в LRU
+        expires_at = time.monotonic() + self.local_ttl - max(0.0, time.time() - loaded_at)
+        with self._lock:
+            for product_id, row in rows.items():
+                key = (store_id, product_id)
+                self._local[key] = (row, expires_at)
+                self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    @staticmethod
+    def _load(store_id, product_ids):
+        if not product_ids:
+            return {}
+        rows = SyncedDataFromProduct.objects.filter(store_id=store_id, product_id__in=product_ids).values(*FIELDS)
+        return {row['product_id']: row for row in rows}
+
+    def stats(self):
+        hits = self.local_hits + self.shared_hits
+        total = hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'local_size': len(self._local),
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_ratio': hits / total if total else 0.0,
+            'invalidations': self.invalidations,
+        }
+
+
+PRODUCT_CACHE = ProductDataCache.from_settings()
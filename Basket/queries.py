@@ -0,0 +1,151 @@
+from django.db import connection, transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Greatest, Least
+
+from .models import Basket, BasketItem, SyncedDataFromProduct
+
+
+def product_data_subquery(field):
+    """Поле SyncedDataFromProduct для товара позиции в магазине её корзины."""
+    return Subquery(
+        SyncedDataFromProduct.objects
+        .filter(store_id=OuterRef('cart__store_id'), product_id=OuterRef('product_id'))
+        .values(field)[:1]
+    )
+
+
+def basket_items_queryset(basket_id):
+    """
+    Позиции активной корзины вместе с ценой, скидкой и остатком в магазине — одним запросом.
+    Если товара нет в SyncedDataFromProduct, price/discount/stock_quantity равны None.
+    """
+    return (
+        BasketItem.objects
+        .select_related('cart')
+        .filter(cart__id=basket_id, cart__is_active=True)
+        .annotate(
+            price=product_data_subquery('price'),
+            discount=product_data_subquery('discount'),
+            stock_quantity=product_data_subquery('quantity'),
+        )
+        .order_by('id')
+    )
+
+
+def basket_items_with_stock(basket_id):
+    return list(basket_items_queryset(basket_id))
+
+
+async def abasket_items_with_stock(basket_id):
+    return [item async for item in basket_items_queryset(basket_id)]
+
+
+def active_baskets_for_products(store_id, product_ids):
+    """
+    Обратный индекс (store_id, product_id) -> активные корзины: id активных корзин магазина,
+    в которых лежат товары product_ids. Опирается на индекс BasketItem(product_id, cart),
+    поэтому всегда согласован со вставками/удалениями позиций и деактивацией корзин.
+    """
+    return list(
+        BasketItem.objects
+        .filter(product_id__in=list(product_ids), cart__store_id=store_id, cart__is_active=True)
+        .values_list('cart_id', flat=True)
+        .distinct()
+    )
+
+
+def clamp_products_to_stock(store_id, product_ids):
+    """
+    Урезает до остатка позиции товаров product_ids во всех активных корзинах магазина одним UPDATE.
+    Условия на корзину — через EXISTS, без JOIN'а: иначе MySQL потребовал бы отдельный SELECT id.
+    """
+    stock = Subquery(
+        SyncedDataFromProduct.objects
+        .filter(store_id=store_id, product_id=OuterRef('product_id'))
+        .values('quantity')[:1]
+    )
+    return (
+        BasketItem.objects
+        .filter(product_id__in=list(product_ids))
+        .filter(Exists(Basket.objects.filter(id=OuterRef('cart_id'), store_id=store_id, is_active=True)))
+        .filter(quantity__gt=stock)
+        .update(quantity=stock)
+    )
+
+
+def _delta_plan(basket_id, deltas):
+    """
+    Условный UPDATE для {item_id: delta}: quantity = LEAST(quantity + delta, остаток), но не меньше 0.
+    Трогаются только позиции активной корзины, у товара которых есть строка в SyncedDataFromProduct.
+    """
+    stock_rows = SyncedDataFromProduct.objects.filter(
+        store_id=Subquery(Basket.objects.filter(id=basket_id).values('store_id')[:1]),
+        product_id=OuterRef('product_id'),
+    )
+    queryset = BasketItem.objects.filter(pk__in=list(deltas), cart_id=basket_id).filter(
+        Exists(Basket.objects.filter(id=basket_id, is_active=True)),
+        Exists(stock_rows),
+    )
+
+    def per_item(values):
+        return Case(
+            *[When(pk=pk, then=Value(value)) for pk, value in values.items() if value],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    # quantity беззнаковый: отрицательную дельту вычитаем из GREATEST(quantity, |delta|),
+    # чтобы промежуточный результат не уходил ниже нуля
+    increase = per_item({pk: max(delta, 0) for pk, delta in deltas.items()})
+    decrease = per_item({pk: max(-delta, 0) for pk, delta in deltas.items()})
+    quantity = Least(
+        Greatest(F('quantity') + increase, decrease, output_field=IntegerField()) - decrease,
+        Subquery(stock_rows.values('quantity')[:1]),
+        output_field=IntegerField(),
+    )
+    return queryset, quantity
+
+
+def _split_delta_result(deltas, items):
+    """Делит перечитанные позиции на оставшиеся, обнулённые (к удалению) и не найденные."""
+    found = {item.pk: item for item in items if item.stock_quantity is not None}
+    kept = [item for item in found.values() if item.quantity > 0]
+    emptied = [pk for pk, item in found.items() if item.quantity <= 0]
+    missing = [pk for pk in deltas if pk not in found]
+    return kept, emptied, missing
+
+
+def apply_quantity_deltas(basket_id, deltas):
+    """
+    Атомарно применяет дельты количества без read-modify-write: один UPDATE на все позиции,
+    один SELECT нового состояния (с ценой и остатком) и DELETE, если какие-то позиции обнулились.
+    Возвращает (позиции, id удалённых, id не найденных).
+    """
+    queryset, quantity = _delta_plan(basket_id, deltas)
+    with transaction.atomic():
+        queryset.update(quantity=quantity)
+        items = list(basket_items_queryset(basket_id).filter(pk__in=list(deltas)))
+        kept, emptied, missing = _split_delta_result(deltas, items)
+        if emptied:
+            # quantity=0 в условии: между UPDATE и DELETE позицию могли снова увеличить
+            BasketItem.objects.filter(pk__in=emptied, quantity=0).delete()
+    return kept, emptied, missing
+
+
+def upsert_basket_items(basket, lines):
+    """
+    Добавляет или перезаписывает позиции корзины одним INSERT ... ON CONFLICT / ON DUPLICATE KEY
+    по уникальному ключу (cart, product_id). lines — {product_id: (quantity, sku)}.
+    """
+    objs = [
+        BasketItem(cart=basket, product_id=product_id, quantity=quantity, sku=sku)
+        for product_id, (quantity, sku) in lines.items()
+    ]
+    # MySQL не принимает unique_fields: ON DUPLICATE KEY UPDATE сам находит конфликтующий ключ
+    unique_fields = ['cart', 'product_id'] if connection.features.supports_update_conflicts_with_target else None
+    BasketItem.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        update_fields=['quantity', 'sku'],
+        unique_fields=unique_fields,
+    )
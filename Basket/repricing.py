@@ -0,0 +1,42 @@
+import logging
+
+from .product_cache import PRODUCT_CACHE
+from .queries import active_baskets_for_products, clamp_products_to_stock
+from .totals import basket_totals_transaction
+
+logger = logging.getLogger(__name__)
+
+
+def apply_product_changes(store_id, product_ids):
+    """
+    Реакция на изменение цены, скидки или остатка товаров магазина: через обратный индекс
+    находит активные корзины с этими товарами, одним UPDATE урезает их позиции до остатка
+    и пересчитывает их итоги. Чтение корзины после этого ничего не пишет.
+    Возвращает id затронутых корзин.
+    """
+    product_ids = list(product_ids)
+    basket_ids = active_baskets_for_products(store_id, product_ids)
+    if not basket_ids:
+        return []
+
+    with basket_totals_transaction(basket_ids):
+        clamped = clamp_products_to_stock(store_id, product_ids)
+
+    logger.debug("Магазин %s, товары %s: затронуто корзин %s, урезано позиций %s",
+                 store_id, product_ids, len(basket_ids), clamped)
+    return basket_ids
+
+
+def product_data_changed(store_id, product_ids):
+    """
+    Точка входа для писателей SyncedDataFromProduct. Синхронизация цен и остатков пишет таблицу
+    снаружи, bulk-операциями и без сигналов, поэтому после коммита своей записи она сообщает,
+    какие товары магазина изменились: сообщением {"store_id": ..., "product_ids": [...]}
+    в очередь ProductDataChanged (Basket/consumer.py) или командой
+    manage.py product_data_changed --store STORE_ID PRODUCT_ID ...
+    Писатели внутри процесса вызывают функцию напрямую, так же как Basket/signals.py.
+    Сначала сбрасывает кэш цен и остатков, чтобы пересчёт и следующие запросы видели новые строки.
+    """
+    product_ids = list(product_ids)
+    PRODUCT_CACHE.invalidate(store_id, product_ids)
+    return apply_product_changes(store_id, product_ids)
@@ -1,3 +1,5 @@
+import decimal
+
 from rest_framework import serializers
 from .models import Basket, BasketItem
 
@@ -24,7 +26,7 @@ class BasketItemSerializer(serializers.ModelSerializer):
         if not price_data:
             return 'Price data is missing'
 
-        product_info = next((product for product in price_data if product['product_id'] == obj.product_id), None)
+        product_info = price_data.get(obj.product_id)
 
         if not product_info:
             return 'Undefined'
@@ -38,6 +40,13 @@ class BasketItemSerializer(serializers.ModelSerializer):
 
 
 
+class BasketItemLineSerializer(serializers.Serializer):
+    """Строка пакетного добавления в корзину."""
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+
 class BasketSerializer(serializers.ModelSerializer):
 
 
@@ -45,3 +54,42 @@ class BasketSerializer(serializers.ModelSerializer):
         model = Basket
         fields = ['pk', 'session_id', 'store_id']
 
+
+def basket_item_rows(items):
+    """
+    Позиции из queries.basket_items_queryset (с ценой и остатком) со стоимостью
+    и stock_quantity; цены уже пришли вместе с позициями и повторно не запрашиваются.
+    Количество показывается не больше остатка: остатки пишут и без сигналов, поэтому
+    урезание в БД (Basket/repricing.py) может ещё не случиться. В БД здесь ничего не пишется.
+    """
+    for item in items:
+        if item.stock_quantity is not None:
+            item.quantity = min(item.quantity, item.stock_quantity)
+
+    price_data = {
+        item.product_id: {'product_id': item.product_id, 'price': item.price, 'discount': item.discount}
+        for item in items
+    }
+    data = BasketItemSerializer(items, many=True, context={'price_data': price_data}).data
+
+    # Добавляем информацию о доступном количестве к каждому товару
+    for item, row in zip(items, data):
+        row['stock_quantity'] = item.stock_quantity
+    return data
+
+
+def basket_items_data(items):
+    """Ответ списка позиций корзины: позиции и общая сумма."""
+    data = basket_item_rows(items)
+
+    # Вычисляем общую сумму
+    total_sum = sum(
+        row['total_item_price']
+        for row in data if isinstance(row['total_item_price'], (int, float, decimal.Decimal))
+    )
+
+    return {
+        'items': data,
+        'store_id': items[0].cart.store_id,
+        'total_sum': total_sum,
+    }
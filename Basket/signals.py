@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import SyncedDataFromProduct
+from .repricing import product_data_changed
+
+
+@receiver(post_save, sender=SyncedDataFromProduct)
+@receiver(post_delete, sender=SyncedDataFromProduct)
+def on_product_data_change(sender, instance, **kwargs):
+    # Всё делаем после коммита, иначе параллельный запрос успеет закэшировать старую строку.
+    # bulk_create/update сигналов не шлют — такие писатели вызывают product_data_changed сами
+    # (очередь ProductDataChanged или команда product_data_changed)
+    store_id, product_id = instance.store_id, instance.product_id
+
+    def after_commit():
+        # Цена, скидка или остаток могли измениться: сбрасываем кэш, урезаем позиции и пересчитываем
+        # итоги только тех активных корзин, где лежит этот товар
+        product_data_changed(store_id, [product_id])
+
+    transaction.on_commit(after_commit)
@@ -1,3 +1,481 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .archive import archive_baskets
+from .consumer import callback_from_product_data, inactiveTheBasket
+from .customer_client import CustomerClient, CustomerServiceUnavailable
+from .models import Basket, BasketArchive, BasketItem, BasketItemArchive, SyncedDataFromProduct
+from .product_cache import PRODUCT_CACHE, ProductDataCache
+from .queries import active_baskets_for_products, apply_quantity_deltas
+from .totals import basket_totals_transaction
+
+
+class BasketFixtureMixin:
+    store_id = 1
+
+    def make_basket(self, items, **fields):
+        """items — [(product_id, quantity, stock)]; для каждого товара создаётся строка SyncedDataFromProduct."""
+        basket = Basket.objects.create(store_id=self.store_id, session_id='session', **fields)
+        for product_id, quantity, stock in items:
+            SyncedDataFromProduct.objects.update_or_create(
+                store_id=self.store_id, product_id=product_id,
+                defaults={'sku': f"SKU{product_id}", 'price': Decimal('100.00'), 'discount': Decimal('10.00'),
+                          'quantity': stock},
+            )
+            BasketItem.objects.create(cart=basket, product_id=product_id, quantity=quantity, sku=f"SKU{product_id}")
+        return basket
+
+
+class BasketItemListQueryTests(BasketFixtureMixin, TestCase):
+    def test_query_count_does_not_depend_on_basket_size(self):
+        for size in (1, 25):
+            basket = self.make_basket([(product_id, 1, 10) for product_id in range(1, size + 1)])
+            with self.assertNumQueries(1):
+                response = self.client.get(f"/cart/{basket.id}/items/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['items']), size)
+            self.assertEqual(response.json()['total_sum'], 90 * size)
+
+
+class ProductDataCacheTests(BasketFixtureMixin, TestCase):
+    def setUp(self):
+        PRODUCT_CACHE.clear()
+
+    def test_shared_ttl_is_capped_by_local_ttl(self):
+        cache = ProductDataCache(shared_alias='default', local_ttl=5, shared_ttl=300)
+        self.assertEqual(cache.shared_ttl, 5)
+
+    @override_settings(BASKET_PRODUCT_CACHE={'SHARED_ALIAS': 'default'},
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_backend_is_not_used_as_shared_tier(self):
+        self.assertIsNone(ProductDataCache.from_settings().shared_alias)
+
+    def test_bulk_add_sees_stock_written_without_signals(self):
+        basket = self.make_basket([(1, 1, 5)])
+        self.assertEqual(PRODUCT_CACHE.get(self.store_id, 1)['quantity'], 5)
+
+        # Запись мимо ORM-сигналов, как у внешнего писателя; локальный уровень истёк
+        SyncedDataFromProduct.objects.filter(store_id=self.store_id, product_id=1).update(quantity=0)
+        PRODUCT_CACHE.clear()
+
+        response = self.client.post(f"/cart/{basket.id}/items/bulk/",
+                                    [{'product_id': 1, 'quantity': 2}], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['results'], [{'product_id': 1, 'status': 'out_of_stock', 'stock_quantity': 0}])
+
+
+class StubCustomerHandler(BaseHTTPRequestHandler):
+    """
+    /customer/<id> отвечает кодом из statuses сервера (по умолчанию 200) и считает запросы.
+    Соединения keep-alive (HTTP/1.1); если для id есть событие в gates, ответ ждёт его.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        customer_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+        self.server.requests.append(customer_id)
+        gate = self.server.gates.get(customer_id)
+        if gate is not None:
+            gate.wait(5)
+        self.send_response(self.server.statuses.get(customer_id, 200))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_customer_service(testcase):
+    """Заглушка сервиса покупателей в потоке; возвращает сервер и клиент к ней."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubCustomerHandler)
+    server.statuses = {'missing': 404, 'broken': 503}
+    server.requests = []
+    server.gates = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    testcase.addCleanup(thread.join)
+    testcase.addCleanup(server.server_close)
+    testcase.addCleanup(server.shutdown)
+    client = CustomerClient(f"http://127.0.0.1:{server.server_port}/", failure_threshold=2, reset_timeout=30)
+    testcase.addCleanup(client.close)
+    return server, client
+
+
+class CustomerClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server, self.client = start_customer_service(self)
+
+    def test_verified_customer_is_cached(self):
+        self.assertTrue(self.client.verify('42'))
+        self.assertTrue(self.client.verify('42'))
+        self.assertFalse(self.client.verify('missing'))
+        self.assertEqual(self.server.requests, ['42', 'missing'])
+
+    def test_async_verify(self):
+        self.assertTrue(async_to_sync(self.client.averify)('42'))
+        self.assertFalse(async_to_sync(self.client.averify)('missing'))
+
+    def test_async_verify_in_separate_event_loops(self):
+        # Каждый asyncio.run — свой loop: keep-alive соединения прошлого loop'а использовать нельзя
+        for customer_id in ('1', '2', '3'):
+            self.assertTrue(asyncio.run(self.client.averify(customer_id)))
+        self.assertEqual(self.server.requests, ['1', '2', '3'])
+        self.assertEqual(self.client._async_clients, {})
+
+    def test_concurrent_call_does_not_release_trial(self):
+        breaker = self.client.breaker
+        self.server.gates['slow'] = threading.Event()
+        # Запрос ушёл при замкнутом автомате и ещё выполняется
+        concurrent = threading.Thread(target=self.client.verify, args=('slow',))
+        concurrent.start()
+        while 'slow' not in self.server.requests:
+            time.sleep(0.01)
+
+        breaker.failures, breaker.opened_at = 2, time.monotonic() - 60
+        self.assertEqual(breaker.acquire(), (True, True))
+
+        self.server.gates['slow'].set()
+        concurrent.join()
+        # Завершившийся параллельный запрос не занимал место пробного и не освобождает его
+        self.assertTrue(breaker.trial_in_flight)
+        breaker.release()
+        self.assertFalse(breaker.trial_in_flight)
+
+    def test_breaker_opens_after_server_errors(self):
+        for _ in range(2):
+            with self.assertRaises(CustomerServiceUnavailable):
+                self.client.verify('broken')
+        with self.assertRaises(CustomerServiceUnavailable):
+            self.client.verify('42')
+        self.assertEqual(self.client.breaker.state, 'open')
+        self.assertEqual(self.server.requests, ['broken', 'broken'])
+
+    def test_failed_trial_request_releases_breaker(self):
+        breaker = self.client.breaker
+        breaker.opened_at = time.monotonic() - 60  # reset_timeout прошёл — автомат полуразомкнут
+        with mock.patch.object(self.client.session, 'get', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.verify('42')
+        self.assertFalse(breaker.trial_in_flight)
+
+        self.assertTrue(self.client.verify('42'))
+        self.assertEqual(breaker.state, 'closed')
+
+
+class AsyncBasketViewTests(BasketFixtureMixin, TestCase):
+    def setUp(self):
+        PRODUCT_CACHE.clear()
+        self.async_client = AsyncClient()
+
+    def test_create_basket_verifies_customers_from_separate_event_loops(self):
+        server, client = start_customer_service(self)
+        # Каждый запрос async_to_sync идёт в своём event loop'е
+        with mock.patch('Basket.async_views.CUSTOMER_CLIENT', client):
+            for username in ('first', 'second'):
+                user = User.objects.create_user(username)
+                self.async_client.force_login(user)
+                response = async_to_sync(self.async_client.post)(
+                    '/async/cart/', {'store_id': self.store_id}, content_type='application/json')
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.json()['store_id'], self.store_id)
+        self.assertEqual(len(server.requests), 2)
+
+    def test_non_object_body_is_rejected(self):
+        basket = self.make_basket([(1, 1, 5)])
+        item = basket.items.get()
+        for body in ('[1]', '"delta"', '1', '{'):
+            with self.subTest(body=body):
+                response = async_to_sync(self.async_client.patch)(
+                    f"/async/cart/{basket.id}/items/{item.id}/", body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                response = async_to_sync(self.async_client.post)(
+                    f"/async/cart/{basket.id}/items/", body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_add_list_and_change_item(self):
+        basket = self.make_basket([(1, 1, 5)])
+        SyncedDataFromProduct.objects.create(store_id=self.store_id, product_id=2, sku='SKU2',
+                                             price=Decimal('50.00'), discount=Decimal('0.00'), quantity=1)
+
+        response = async_to_sync(self.async_client.post)(
+            f"/async/cart/{basket.id}/items/", {'product_id': 2, 'quantity': 1, 'sku': 'SKU2'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        item_id = response.json()['id']
+
+        response = async_to_sync(self.async_client.get)(f"/async/cart/{basket.id}/items/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(row['product_id'] for row in response.json()['items']), [1, 2])
+
+        response = async_to_sync(self.async_client.patch)(
+            f"/async/cart/{basket.id}/items/{item_id}/", {'delta': -1}, content_type='application/json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(BasketItem.objects.filter(id=item_id).exists())
+
+
+class QuantityDeltaTests(BasketFixtureMixin, TestCase):
+    def test_increase_is_clamped_at_stock(self):
+        basket = self.make_basket([(1, 2, 3)])
+        item = basket.items.get()
+        kept, deleted, missing = apply_quantity_deltas(basket.id, {item.id: 5})
+        self.assertEqual([(i.id, i.quantity, i.stock_quantity) for i in kept], [(item.id, 3, 3)])
+        self.assertEqual((deleted, missing), ([], []))
+
+    def test_item_reaching_zero_is_deleted(self):
+        basket = self.make_basket([(1, 1, 3), (2, 2, 3)])
+        first, second = basket.items.order_by('id')
+        kept, deleted, missing = apply_quantity_deltas(basket.id, {first.id: -3, second.id: -1})
+        self.assertEqual([(i.id, i.quantity) for i in kept], [(second.id, 1)])
+        self.assertEqual(deleted, [first.id])
+        self.assertEqual(missing, [])
+        self.assertFalse(BasketItem.objects.filter(id=first.id).exists())
+
+    def test_missing_items_are_reported_and_left_untouched(self):
+        basket = self.make_basket([(1, 1, 3)])
+        other = self.make_basket([(2, 1, 3)])
+        unsold = BasketItem.objects.create(cart=basket, product_id=99, quantity=1, sku='SKU99')
+        foreign = other.items.get()
+
+        kept, deleted, missing = apply_quantity_deltas(basket.id, {unsold.id: 1, foreign.id: 1, 123456: 1})
+        self.assertEqual((kept, deleted), ([], []))
+        self.assertEqual(sorted(missing), sorted([unsold.id, foreign.id, 123456]))
+        self.assertEqual(BasketItem.objects.get(id=foreign.id).quantity, 1)
+        self.assertEqual(BasketItem.objects.get(id=unsold.id).quantity, 1)
+
+    def test_inactive_basket_is_not_changed(self):
+        basket = self.make_basket([(1, 1, 3)], is_active=False)
+        item = basket.items.get()
+        self.assertEqual(apply_quantity_deltas(basket.id, {item.id: 1}), ([], [], [item.id]))
+        self.assertEqual(BasketItem.objects.get(id=item.id).quantity, 1)
+
+    def test_deltas_action(self):
+        basket = self.make_basket([(1, 1, 3), (2, 1, 3)])
+        first, second = basket.items.order_by('id')
+        response = self.client.post(f"/cart/{basket.id}/items/deltas/",
+                                    {'deltas': {str(first.id): 5, str(second.id): -1, '123456': 1}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([(row['id'], row['quantity']) for row in data['items']], [(first.id, 3)])
+        self.assertEqual(data['deleted'], [second.id])
+        self.assertEqual(data['not_found'], [123456])
+
+        basket.refresh_from_db()
+        self.assertEqual((basket.item_count, basket.grand_total), (3, Decimal('270.00')))
+
+    def test_deltas_action_rejects_bad_payload(self):
+        basket = self.make_basket([(1, 1, 3)])
+        for payload in ({}, {'deltas': []}, {'deltas': {'x': 1}}):
+            with self.subTest(payload=payload):
+                response = self.client.post(f"/cart/{basket.id}/items/deltas/", payload,
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+
+class ActiveBasketsForProductsTests(BasketFixtureMixin, TestCase):
+    def test_reverse_index_is_created_by_migrations(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, BasketItem._meta.db_table)
+        self.assertEqual(constraints['basketitem_product_cart_idx']['columns'], ['product_id', 'cart_id'])
+
+    def test_returns_active_baskets_of_the_store(self):
+        both = self.make_basket([(1, 1, 5), (2, 1, 5)])
+        only_second = self.make_basket([(2, 1, 5)])
+        self.make_basket([(3, 1, 5)])
+        self.make_basket([(1, 1, 5)], is_active=False)
+        other_store = Basket.objects.create(store_id=self.store_id + 1, session_id='session')
+        BasketItem.objects.create(cart=other_store, product_id=1, quantity=1, sku='SKU1')
+
+        self.assertEqual(sorted(active_baskets_for_products(self.store_id, [1, 2])),
+                         sorted([both.id, only_second.id]))
+        self.assertEqual(active_baskets_for_products(self.store_id, [1]), [both.id])
+        self.assertEqual(active_baskets_for_products(self.store_id, []), [])
+
+    def test_follows_item_removal_and_deactivation(self):
+        first = self.make_basket([(1, 1, 5)])
+        second = self.make_basket([(1, 1, 5)])
+        first.items.all().delete()
+        self.assertEqual(active_baskets_for_products(self.store_id, [1]), [second.id])
+        Basket.objects.filter(id=second.id).update(is_active=False)
+        self.assertEqual(active_baskets_for_products(self.store_id, [1]), [])
+
+
+class BulkAddTests(BasketFixtureMixin, TestCase):
+    def setUp(self):
+        PRODUCT_CACHE.clear()
+
+    def post(self, basket, lines):
+        return self.client.post(f"/cart/{basket.id}/items/bulk/", lines, content_type='application/json')
+
+    def test_lines_are_merged_clamped_and_upserted(self):
+        basket = self.make_basket([(1, 1, 5), (2, 1, 3), (3, 1, 0)])
+        response = self.post(basket, {'items': [
+            {'product_id': 1, 'quantity': 2},
+            {'product_id': 1, 'quantity': 2},
+            {'product_id': 2, 'quantity': 10},
+            {'product_id': 3},
+            {'product_id': 99, 'quantity': 1},
+            {'product_id': 0},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        results = {(row['product_id'], row['status']) for row in response.json()['results']}
+        self.assertEqual(results, {(1, 'ok'), (2, 'clamped'), (3, 'out_of_stock'), (99, 'not_found'), (0, 'invalid')})
+
+        quantities = dict(basket.items.values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {1: 4, 2: 3, 3: 1})
+        basket.refresh_from_db()
+        # Позиция товара 3 без остатка в итоги не входит
+        self.assertEqual(basket.item_count, 7)
+
+    def test_nothing_accepted(self):
+        basket = self.make_basket([(1, 1, 0)])
+        response = self.post(basket, [{'product_id': 1, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post(basket, []).status_code, 400)
+
+
+class BasketTotalsTransactionTests(BasketFixtureMixin, TestCase):
+    def test_mutation_is_rolled_back_with_failed_totals(self):
+        basket = self.make_basket([(1, 1, 5)])
+        item = basket.items.get()
+        with mock.patch('Basket.totals.refresh_basket_totals', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), basket_totals_transaction([basket.id]):
+                apply_quantity_deltas(basket.id, {item.id: 2})
+        self.assertEqual(BasketItem.objects.get(id=item.id).quantity, 1)
+
+    def test_totals_follow_every_mutation(self):
+        basket = self.make_basket([(1, 2, 5), (2, 1, 5)])
+        first, second = basket.items.order_by('id')
+
+        self.client.put(f"/cart/{basket.id}/items/{first.id}/", {'delta': 1}, content_type='application/json')
+        basket.refresh_from_db()
+        self.assertEqual((basket.item_count, basket.grand_total), (4, Decimal('360.00')))
+
+        self.client.delete(f"/cart/{basket.id}/items/{second.id}/")
+        basket.refresh_from_db()
+        self.assertEqual((basket.item_count, basket.grand_total), (3, Decimal('270.00')))
+
+
+class StockClampOnReadTests(BasketFixtureMixin, TestCase):
+    def test_list_and_totals_do_not_exceed_stock(self):
+        basket = self.make_basket([(1, 5, 10), (2, 1, 10)])
+        # Остаток меняется без сигналов: позиции в БД не урезаны
+        SyncedDataFromProduct.objects.filter(store_id=self.store_id, product_id=1).update(quantity=2)
+
+        response = self.client.get(f"/cart/{basket.id}/items/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([(row['product_id'], row['quantity']) for row in data['items']], [(1, 2), (2, 1)])
+        self.assertEqual(Decimal(str(data['total_sum'])), Decimal('270'))
+
+        with basket_totals_transaction([basket.id]):
+            pass
+        basket.refresh_from_db()
+        self.assertEqual((basket.item_count, basket.grand_total), (3, Decimal('270.00')))
+        self.assertEqual(basket.items.get(product_id=1).quantity, 5)
+
+
+class ProductDataChangedTests(BasketFixtureMixin, TestCase):
+    """Писатель SyncedDataFromProduct работает bulk-операциями, сигналы не приходят."""
+
+    def bulk_write(self):
+        basket = self.make_basket([(1, 5, 10), (2, 1, 10)])
+        SyncedDataFromProduct.objects.filter(store_id=self.store_id, product_id=1).update(
+            quantity=2, price=Decimal('50.00'), discount=Decimal('0.00'))
+        return basket
+
+    def assert_basket_repriced(self, basket):
+        basket.refresh_from_db()
+        self.assertEqual(basket.items.get(product_id=1).quantity, 2)
+        self.assertEqual((basket.item_count, basket.grand_total), (3, Decimal('190.00')))
+
+    def test_queue_message_applies_changes(self):
+        basket = self.bulk_write()
+        channel, method = mock.Mock(), mock.Mock(delivery_tag=7)
+
+        body = json.dumps({'store_id': self.store_id, 'product_ids': [1]})
+        callback_from_product_data(channel, method, None, body)
+
+        self.assert_basket_repriced(basket)
+        channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_queue_message_invalidates_product_cache(self):
+        self.make_basket([(1, 1, 5)])
+        PRODUCT_CACHE.clear()
+        self.assertEqual(PRODUCT_CACHE.get(self.store_id, 1)['quantity'], 5)
+        SyncedDataFromProduct.objects.filter(store_id=self.store_id, product_id=1).update(quantity=0)
+
+        body = json.dumps({'store_id': self.store_id, 'product_ids': [1]})
+        callback_from_product_data(mock.Mock(), mock.Mock(), None, body)
+
+        self.assertEqual(PRODUCT_CACHE.get(self.store_id, 1)['quantity'], 0)
+
+    def test_management_command_applies_changes(self):
+        basket = self.bulk_write()
+
+        call_command('product_data_changed', '--store', str(self.store_id), '1', stdout=mock.Mock())
+
+        self.assert_basket_repriced(basket)
+
+
+class ArchiveTests(BasketFixtureMixin, TestCase):
+    def test_deactivation_is_timestamped(self):
+        basket = self.make_basket([])
+        inactiveTheBasket(basket.id)
+        basket.refresh_from_db()
+        self.assertFalse(basket.is_active)
+        self.assertIsNotNone(basket.deactivated_at)
+
+    def test_archives_by_inactivity_not_age(self):
+        long_ago = timezone.now() - timedelta(days=60)
+        stale = self.make_basket([(1, 1, 5)], is_active=False, deactivated_at=long_ago)
+        recent = self.make_basket([(1, 1, 5)], is_active=False, deactivated_at=timezone.now())
+        active = self.make_basket([(1, 1, 5)])
+        # Созданы давно, но деактивирована только одна — и только что
+        Basket.objects.filter(id__in=[stale.id, recent.id, active.id]).update(created_at=long_ago)
+
+        self.assertEqual(archive_baskets(older_than_days=30), 1)
+        self.assertEqual(list(BasketArchive.objects.values_list('id', 'deactivated_at')), [(stale.id, long_ago)])
+        self.assertEqual(BasketItemArchive.objects.get().cart_id, stale.id)
+        self.assertEqual(set(Basket.objects.values_list('id', flat=True)), {recent.id, active.id})
+
+
+class BasketSummaryTests(BasketFixtureMixin, TestCase):
+    def test_summary_follows_price_written_without_signals(self):
+        basket = self.make_basket([(1, 2, 10), (2, 1, 10)])
+        SyncedDataFromProduct.objects.filter(store_id=self.store_id, product_id=1).update(
+            price=Decimal('50.00'), discount=Decimal('0.00'))
+        SyncedDataFromProduct.objects.filter(store_id=self.store_id, product_id=2).update(quantity=0)
+
+        response = self.client.get(f"/cart/{basket.id}/summary/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['item_count'], 2)
+        self.assertEqual(Decimal(str(data['subtotal'])), Decimal('100.00'))
+        self.assertEqual(Decimal(str(data['grand_total'])), Decimal('100.00'))
+
+    def test_migration_backfills_totals_of_active_baskets(self):
+        active = self.make_basket([(1, 2, 10)])
+        inactive = self.make_basket([(1, 1, 10)], is_active=False)
+        Basket.objects.update(item_count=0, grand_total=0)
+
+        migration = importlib.import_module('Basket.migrations.0014_backfill_basket_totals')
+        migration.backfill_totals(apps, None)
+
+        self.assertEqual(Basket.objects.filter(id=active.id).values_list('item_count', 'grand_total').get(),
+                         (2, Decimal('180.00')))
+        self.assertEqual(Basket.objects.get(id=inactive.id).item_count, 0)
@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import Basket, BasketItem
+from .queries import product_data_subquery
+
+TOTAL_FIELDS = ['item_count', 'subtotal', 'discount_total', 'grand_total']
+
+CENT = Decimal('0.01')
+
+
+def empty_totals():
+    return {'item_count': 0, 'subtotal': Decimal(0), 'discount_total': Decimal(0), 'grand_total': Decimal(0)}
+
+
+def add_line(totals, quantity, price, discount):
+    """Добавляет позицию к итогам; цена со скидкой считается как в BasketItemSerializer."""
+    totals['item_count'] += quantity
+    if price is None:
+        return
+    line = price * quantity
+    line_discount = line * (discount or 0) / 100
+    totals['subtotal'] += line
+    totals['discount_total'] += line_discount
+    totals['grand_total'] += line - line_discount
+
+
+def rounded(totals):
+    return {field: value.quantize(CENT) if isinstance(value, Decimal) else value for field, value in totals.items()}
+
+
+def save_totals(totals_by_basket):
+    """Записывает итоги {basket_id: totals} одним UPDATE."""
+    if not totals_by_basket:
+        return
+    baskets = [Basket(id=basket_id, **rounded(totals)) for basket_id, totals in totals_by_basket.items()]
+    Basket.objects.bulk_update(baskets, TOTAL_FIELDS)
+
+
+def compute_basket_totals(basket_ids):
+    """
+    Итоги {basket_id: totals} по текущим позициям, ценам и остаткам — один SELECT.
+    Количество позиции берётся не больше остатка, как в basket_item_rows.
+    """
+    # id из URL приходят строками, из БД — UUID: приводим к одному виду
+    basket_ids = {Basket._meta.pk.to_python(basket_id) for basket_id in basket_ids}
+    if not basket_ids:
+        return {}
+    totals_by_basket = {basket_id: empty_totals() for basket_id in basket_ids}
+    rows = (
+        BasketItem.objects.filter(cart_id__in=basket_ids)
+        .annotate(price=product_data_subquery('price'), discount=product_data_subquery('discount'),
+                  stock_quantity=product_data_subquery('quantity'))
+        .values_list('cart_id', 'quantity', 'price', 'discount', 'stock_quantity')
+    )
+    for basket_id, quantity, price, discount, stock_quantity in rows:
+        if stock_quantity is not None:
+            quantity = min(quantity, stock_quantity)
+        add_line(totals_by_basket[basket_id], quantity, price, discount)
+    return totals_by_basket
+
+
+def refresh_basket_totals(basket_ids):
+    """
+    Пересчитывает итоги указанных корзин: один SELECT позиций с ценами и один UPDATE.
+    Итоги считаются заново только для затронутых корзин, а не накапливаются дельтами:
+    дельты расходятся с данными при параллельных записях и урезании по остатку.
+    """
+    save_totals(compute_basket_totals(basket_ids))
+
+
+@contextmanager
+def basket_totals_transaction(basket_ids):
+    """
+    Изменение позиций корзин и пересчёт их итогов в одной транзакции.
+    Строки корзин блокируются (SELECT ... FOR UPDATE, по порядку id) до первого чтения, поэтому
+    параллельные изменения одной корзины выполняются по очереди и пересчёт видит все закоммиченные
+    позиции: в REPEATABLE READ снимок MySQL берётся при первом обычном SELECT, уже после блокировки.
+    Если блок или пересчёт падает, откатываются и позиции, и итоги.
+    """
+    basket_ids = sorted({Basket._meta.pk.to_python(basket_id) for basket_id in basket_ids})
+    with transaction.atomic():
+        list(Basket.objects.select_for_update().filter(id__in=basket_ids).order_by('id').values_list('id', flat=True))
+        yield
+        refresh_basket_totals(basket_ids)
+
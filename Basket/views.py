@@ -1,18 +1,22 @@
 import decimal
 from functools import cached_property
-from django.contrib.sites import requests
 from django.db.models import Q, Subquery, OuterRef
 from requests import RequestException
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import get_object_or_404
-import requests
 from rest_framework.response import Response
 from rest_framework.status import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
 from .models import Basket, BasketItem
-from .serializers import BasketSerializer, BasketItemSerializer
-from .sourcesUrls import customer, ecommerce
+from .serializers import (
+    BasketSerializer, BasketItemSerializer, BasketItemLineSerializer, basket_item_rows, basket_items_data,
+)
 from .models import SyncedDataFromProduct
+from .customer_client import CUSTOMER_CLIENT, CustomerServiceUnavailable
+from .product_cache import PRODUCT_CACHE
+from .queries import apply_quantity_deltas, basket_items_with_stock, upsert_basket_items
+from .totals import basket_totals_transaction, compute_basket_totals, rounded
 
 from pprint import pprint
 
@@ -21,7 +25,6 @@ from pprint import pprint
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
-import requests
 from .models import Basket
 from .serializers import BasketSerializer  # Предполагаю, что у тебя есть сериализатор
 from django.core.exceptions import ObjectDoesNotExist
@@ -55,11 +58,8 @@ class BasketViewSet(viewsets.ModelViewSet):
                 if not session_id:
                     raise ValidationError({"session": "Session ID is required for anonymous users"})
 
-            if customer_id:
-                customer_response = requests.get(
-                        "{}/customer/{}".format(customer,validated_data.get("customer_id")))
-                if customer_response.status_code != 200:
-                    raise ValidationError({"customer": "Customer was not found or blocked"})
+            if customer_id and not CUSTOMER_CLIENT.verify(customer_id):
+                raise ValidationError({"customer": "Customer was not found or blocked"})
 
             try:
                 store_data = SyncedDataFromProduct.objects.filter(
@@ -72,7 +72,7 @@ class BasketViewSet(viewsets.ModelViewSet):
                 customer_id=customer_id,
                 session_id=session_id,
                 store_id=validated_data.get("store_id"),
-                defaults={'is_active': True}
+                is_active=True,
             )
 
             serializer = self.get_serializer(basket)
@@ -80,9 +80,25 @@ class BasketViewSet(viewsets.ModelViewSet):
             status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
             return Response(serializer.data, status=status_code, headers=headers)
 
+        except CustomerServiceUnavailable as e:
+            return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def summary(self, request, *args, **kwargs):
+        """
+        Итоги корзины одним агрегирующим SELECT'ом по текущим ценам и остаткам (без сериализации позиций).
+        Сохранённые итоги не читаются: цены и остатки SyncedDataFromProduct пишут и в обход
+        пересчёта (Basket/repricing.py), и сохранённые значения могут отставать.
+        """
+        summary = Basket.objects.filter(id=kwargs['pk'], is_active=True).values('id', 'store_id').first()
+        if summary is None:
+            return Response({"error": "Basket not found"}, status=status.HTTP_404_NOT_FOUND)
+        totals = compute_basket_totals([summary['id']])[summary['id']]
+        return Response({**summary, **rounded(totals)}, status=status.HTTP_200_OK)
+
 
 
 
@@ -100,50 +116,16 @@ class BasketItemViewSet(viewsets.ModelViewSet):
 
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset:
+        # Позиции, цены, скидки и остатки приходят одним запросом
+        items = basket_items_with_stock(self.kwargs["basket_pk"])
+        if not items:
             return Response({"error": "Basket not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        store_id = queryset[0].cart.store_id
-        print(queryset)
-
-        product_ids = [item.product_id for item in queryset]
-
-        # Получаем данные о наличии товаров
-        stock_data = SyncedDataFromProduct.objects.filter(
-            store_id=store_id, product_id__in=product_ids
-        )
-        if not stock_data or len(stock_data) < len(product_ids):
+        if any(item.stock_quantity is None for item in items):
             raise ValidationError({"error": "No stock data available for basket items"})
 
-        # Создаем словарь с доступным количеством для каждого товара
-        stock_quantity = {item.product_id: item.quantity for item in stock_data}
-
-        for item in queryset:
-            available_quantity = stock_quantity.get(item.product_id, 0)
-            if item.quantity > available_quantity:
-                item.quantity = available_quantity
-                item.save(update_fields=['quantity'])
-
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-
-        # Добавляем информацию о доступном количестве к каждому товару
-        for item in data:
-            item['stock_quantity'] = stock_quantity.get(item['product_id'], 0)
-
-        # Вычисляем общую сумму
-        total_sum = sum(
-            item['total_item_price']
-            for item in data if isinstance(item['total_item_price'], (int, float, decimal.Decimal))
-        )
-
-        response_data = {
-            'items': data,
-            'store_id': store_id,
-            'total_sum': total_sum,
-
-        }
+        # Чтение без записи: до остатка позиции урезаются при изменении остатков (Basket/repricing.py)
+        response_data = basket_items_data(items)
         return Response(response_data, status=status.HTTP_200_OK)
 
 
@@ -164,12 +146,10 @@ class BasketItemViewSet(viewsets.ModelViewSet):
             basket = get_object_or_404(Basket, id=basket_id)
             store_id = basket.store_id
 
-            store_data = (SyncedDataFromProduct.objects.
-                          filter(store_id=store_id, product_id=validated_data.get("product_id")).all())
-            store_data = list(store_data.values())
+            store_data = PRODUCT_CACHE.get(store_id, validated_data.get("product_id"))
 
 
-            if not store_data or not store_data[0].get('quantity', None):
+            if not store_data or not store_data.get('quantity', None):
                 raise ValidationError(
                         {"store_product": "Product was not found or has empty quantity"},
                 )
@@ -177,8 +157,9 @@ class BasketItemViewSet(viewsets.ModelViewSet):
 
 
             validated_data['cart'] = basket
-            validated_data['sku'] = store_data[0]['sku']
-            serializer.save()
+            validated_data['sku'] = store_data['sku']
+            with basket_totals_transaction([basket.id]):
+                serializer.save()
 
             headers = self.get_success_headers(serializer.data)
             return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -203,9 +184,9 @@ class BasketItemViewSet(viewsets.ModelViewSet):
         """
         Обновляет количество товара в корзине. Принимает delta (+1 или -1).
         Если quantity становится <= 0, удаляет запись.
+        Дельта применяется условным UPDATE с ограничением по остатку, поэтому
+        параллельные нажатия не теряются.
         """
-        msg_for_customer = []
-        instance = self.get_object()  # Получаем существующий BasketItem
         delta = request.data.get('delta', 0)  # Получаем изменение количества (+1 или -1)
 
         try:
@@ -213,45 +194,115 @@ class BasketItemViewSet(viewsets.ModelViewSet):
             if delta not in [-1, 1]:
                 raise ValidationError({"delta": "Delta must be +1 or -1"})
 
-            basket = self.kwargs.get('basket_pk')
-            basket_store_id = Basket.objects.filter(id=basket).first().store_id
-
-            if not basket_store_id:
-                raise ValidationError({"basket": "Basket was not found or blocked"})
-
-            # Проверяем доступное количество на складе
-            checked_quantity = SyncedDataFromProduct.objects.filter(
-                product_id=instance.product_id, store_id=basket_store_id
-            ).first().quantity
-
-            new_quantity = instance.quantity + delta
-            if checked_quantity < new_quantity:
-                msg_for_customer.append(f"You have {checked_quantity} items remaining.")
-                new_quantity = checked_quantity
+            try:
+                item_id = int(self.kwargs['pk'])
+            except (TypeError, ValueError):
+                raise NotFound()
 
-            if new_quantity <= 0:
-                instance.delete()
+            with basket_totals_transaction([self.kwargs['basket_pk']]):
+                items, deleted, missing = apply_quantity_deltas(self.kwargs['basket_pk'], {item_id: delta})
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
-            else:
-                instance.quantity = new_quantity
-                instance.save()
-
-            # Сериализуем обновленный объект
-            serializer = self.get_serializer(instance)
-            # Формируем ответ, добавляя stock_quantity
-            response_data = serializer.data
-            response_data['stock_quantity'] = checked_quantity
+            if missing:
+                raise NotFound({"detail": "Item was not found or the product is not sold in the store"})
 
-            if msg_for_customer:
-                response_data['message'] = msg_for_customer
+            response_data = basket_item_rows(items)[0]
+            item = items[0]
+            if delta > 0 and item.quantity >= item.stock_quantity:
+                response_data['message'] = [f"You have {item.stock_quantity} items remaining."]
 
             return Response(response_data, status=status.HTTP_200_OK)
 
         except ValidationError as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except NotFound as e:
+            return Response(e.detail, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_add(self, request, *args, **kwargs):
+        """
+        Пакетное добавление: [{"product_id": ..., "quantity": ...}, ...].
+        Остатки всех строк проверяются одним запросом, позиции записываются одним upsert'ом
+        (количество уже лежащих в корзине товаров перезаписывается). Ответ — результат по каждой строке.
+        """
+        lines = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(lines, list) or not lines:
+            return Response({"detail": {"items": "Expected a non-empty list of {product_id, quantity}"}},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        basket = Basket.objects.filter(id=self.kwargs['basket_pk'], is_active=True).first()
+        if basket is None:
+            return Response({"error": "Basket not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        results = []
+        requested = {}
+        for line in lines:
+            serializer = BasketItemLineSerializer(data=line)
+            if not serializer.is_valid():
+                results.append({'product_id': line.get('product_id') if isinstance(line, dict) else None,
+                                'status': 'invalid', 'errors': serializer.errors})
+                continue
+            product_id = serializer.validated_data['product_id']
+            # Повторы одного товара в запросе складываем
+            requested[product_id] = requested.get(product_id, 0) + serializer.validated_data['quantity']
+
+        store_data = PRODUCT_CACHE.get_many(basket.store_id, requested)
+
+        upserts = {}
+        for product_id, quantity in requested.items():
+            product = store_data.get(product_id)
+            if not product:
+                results.append({'product_id': product_id, 'status': 'not_found'})
+                continue
+            if not product['quantity']:
+                results.append({'product_id': product_id, 'status': 'out_of_stock', 'stock_quantity': 0})
+                continue
+
+            line_status = 'ok'
+            if quantity > product['quantity']:
+                quantity = product['quantity']
+                line_status = 'clamped'
+            upserts[product_id] = (quantity, product['sku'])
+            results.append({'product_id': product_id, 'status': line_status, 'quantity': quantity,
+                            'stock_quantity': product['quantity']})
+
+        if upserts:
+            with basket_totals_transaction([basket.id]):
+                upsert_basket_items(basket, upserts)
+
+        response_status = status.HTTP_201_CREATED if upserts else status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=response_status)
+
+    @action(detail=False, methods=['post'], url_path='deltas')
+    def bulk_update(self, request, *args, **kwargs):
+        """
+        Пакетное изменение количества: {"deltas": {"<item_id>": delta, ...}}.
+        Все дельты применяются одним условным UPDATE; позиции, дошедшие до нуля, удаляются.
+        """
+        deltas = request.data.get('deltas')
+        if not isinstance(deltas, dict) or not deltas:
+            return Response({"detail": {"deltas": "Expected a non-empty object {item_id: delta}"}},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            deltas = {int(item_id): int(delta) for item_id, delta in deltas.items()}
+        except (TypeError, ValueError):
+            return Response({"detail": {"deltas": "Item ids and deltas must be integers"}},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        with basket_totals_transaction([self.kwargs['basket_pk']]):
+            items, deleted, missing = apply_quantity_deltas(self.kwargs['basket_pk'], deltas)
+        return Response({
+            'items': basket_item_rows(items),
+            'deleted': deleted,
+            'not_found': missing,
+        }, status=status.HTTP_200_OK)
+
+
+    def perform_destroy(self, instance):
+        with basket_totals_transaction([instance.cart_id]):
+            instance.delete()
 
     def get_serializer_context(self):
         queryset = self.get_queryset()
@@ -261,14 +312,7 @@ class BasketItemViewSet(viewsets.ModelViewSet):
 
         store_id = queryset[0].cart.store_id
         products_id = [i.product_id for i in queryset]
-        price_data = SyncedDataFromProduct.objects.filter(store_id=store_id, product_id__in=products_id).values()
-
-
-
-        try:
-
-            data = list(price_data)
-        except requests.exceptions.RequestException as e:
-            return {"error": "Error fetching price data from external service"}
+        # Словарь по product_id: сериализатор ищет цену позиции за O(1)
+        price_data = PRODUCT_CACHE.get_many(store_id, products_id)
 
-        return {'price_data': data}
+        return {'price_data': price_data}
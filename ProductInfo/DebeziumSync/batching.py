@@ -0,0 +1,53 @@
+import asyncio
+
+from .coalescing import Coalescer
+
+
+class BatchBuffer:
+    """
+    Буфер сообщений Debezium, разложенных по таблицам.
+    Пачка отдаётся в flush_callback, когда в одной из таблиц набралось max_rows строк
+    или прошло max_delay_ms с момента первого сообщения в буфере.
+    Внутри окна события склеиваются Coalescer'ом: на каждую строку пишется только последнее состояние.
+    """
+
+    def __init__(self, flush_callback, max_rows=500, max_delay_ms=200):
+        self.flush_callback = flush_callback
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.coalescer = Coalescer()
+        self._lock = asyncio.Lock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self.coalescer)
+
+    async def add(self, table_name, message, offset):
+        async with self._lock:
+            self.coalescer.add(table_name, message, offset)
+            if self.coalescer.table_rows.get(table_name, 0) >= self.max_rows:
+                await self._flush_locked()
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush_locked()
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.max_delay)
+        async with self._lock:
+            await self._flush_locked()
+
+    async def _flush_locked(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+
+        if self.coalescer.last_offset is None and not len(self.coalescer):
+            return
+
+        # Пачка отдаётся в порядке последних событий, по таблицам её раскладывает sync_batch.
+        # Offset окна может быть больше offset'ов в пачке: склеенные события тоже считаются обработанными.
+        batch, last_offset = self.coalescer.drain()
+        await self.flush_callback(batch, last_offset)
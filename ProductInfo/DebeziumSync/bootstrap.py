@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, close_old_connections, connection, transaction
+
+from ..http_cache import CATALOG_VERSIONS
+from .mapping import TABLE_MODEL_MAPPING
+from .transform import build_payload
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotLoader:
+    """
+    Первичная загрузка нового узла: события снимка (op='r') пишутся большими INSERT'ами
+    без проверки внешних ключей, а проверка выполняется один раз в конце (как в loaddata).
+    Все пачки идут через один поток, а значит через одно соединение с отключёнными проверками.
+    Загрузка append-only: уже существующие строки пропускаются (ignore_conflicts), поэтому
+    повторная доставка после падения безопасна.
+    """
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cdc-bootstrap")
+        self.tables = set()
+        self.loaded = 0
+        self.checks_disabled = False
+
+    async def load(self, messages):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._load, messages)
+
+    async def finish(self):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._finish)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def _load(self, messages):
+        if not self.checks_disabled:
+            # На MySQL это FOREIGN_KEY_CHECKS=0 для сессии; соединение не закрываем до _finish
+            connection.disable_constraint_checking()
+            self.checks_disabled = True
+
+        rows = {}
+        for message in messages:
+            table_name = message.get('source', {}).get('table')
+            if table_name not in TABLE_MODEL_MAPPING:
+                logger.warning("Неизвестная таблица: %s", table_name)
+                continue
+            payload = build_payload(message)
+            if payload:
+                rows.setdefault(table_name, []).append(payload)
+
+        try:
+            with transaction.atomic():
+                for table_name, model_class in TABLE_MODEL_MAPPING.items():
+                    if not rows.get(table_name):
+                        continue
+                    model_class.objects.bulk_create(
+                        [model_class(**payload) for payload in rows[table_name]],
+                        batch_size=self.batch_size,
+                        ignore_conflicts=True,
+                    )
+                    self.tables.add(model_class._meta.db_table)
+
+                # bulk_create не шлёт сигналы: версии справочников для HTTP-кэша поднимаем сами
+                changed = [model_class for table_name, model_class in TABLE_MODEL_MAPPING.items() if rows.get(table_name)]
+                CATALOG_VERSIONS.bump_on_commit(*changed)
+        except Exception as e:
+            logger.error("Ошибка первичной загрузки (%s сообщений): %s", len(messages), e)
+            return False
+
+        loaded = sum(len(payloads) for payloads in rows.values())
+        self.loaded += loaded
+        logger.info("Первичная загрузка: записано %s строк, всего %s", loaded, self.loaded)
+        return True
+
+    def _finish(self):
+        if not self.checks_disabled:
+            return True
+
+        connection.enable_constraint_checking()
+        self.checks_disabled = False
+        try:
+            connection.check_constraints(table_names=sorted(self.tables))
+        except IntegrityError as e:
+            logger.error("Нарушены внешние ключи после первичной загрузки: %s", e)
+            return False
+        finally:
+            close_old_connections()
+
+        logger.info("Первичная загрузка завершена: %s строк, внешние ключи проверены в таблицах %s",
+                    self.loaded, ', '.join(sorted(self.tables)))
+        return True
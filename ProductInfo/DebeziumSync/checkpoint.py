@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpointer:
+    """
+    Сохраняет offset стрима по расписанию, а не после каждого сообщения:
+    каждые every_messages применённых сообщений, раз в interval секунд и при остановке.
+
+    Сообщения применяются по порядку, поэтому достаточно помнить последний закоммиченный offset.
+    advance() вызывается, когда каждое сообщение окна закоммичено, припарковано или отложено
+    в DeadLetterEvent. Ещё не разрешённые сообщения (стоянка FK, несохранённые ошибки) держит hold():
+    offset не уходит дальше них и сдвигается сам, как только удержание снято. После рестарта
+    удержанные сообщения доставляются заново (upsert по id и delete идемпотентны).
+    """
+
+    def __init__(self, store_callback, every_messages=1000, interval=5.0, hold=None):
+        self.store_callback = store_callback
+        # hold() возвращает наименьший offset, который ещё ждёт применения (стоянка FK, несохранённые ошибки)
+        self.hold = hold
+        self.every_messages = every_messages
+        self.interval = interval
+        self.committed = None
+        self.stored = None
+        self.since_store = 0
+        self._lock = asyncio.Lock()
+        self._timer = None
+
+    def start(self):
+        self._timer = asyncio.create_task(self._run())
+
+    async def advance(self, offset, messages=1):
+        """Все сообщения до offset включительно закоммичены."""
+        if offset is None:
+            return
+        if self.committed is None or offset > self.committed:
+            self.committed = offset
+        self.since_store += messages
+        if self.since_store >= self.every_messages:
+            await self.store()
+
+    async def store(self):
+        async with self._lock:
+            self.since_store = 0
+            offset = self.committed
+            held = self.hold() if self.hold is not None else None
+            if offset is not None and held is not None and held <= offset:
+                offset = held - 1
+            if offset is None or offset < 0 or (self.stored is not None and offset <= self.stored):
+                return
+            try:
+                await self.store_callback(offset)
+            except Exception:
+                # Ошибку уже залогировал store_callback; попробуем снова на следующем checkpoint
+                return
+            self.stored = offset
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.store()
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.store()
+
+    def stats(self):
+        return {
+            'committed': self.committed,
+            'stored': self.stored,
+            'held': self.hold() if self.hold is not None else None,
+        }
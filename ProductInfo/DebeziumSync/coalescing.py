@@ -0,0 +1,72 @@
+def event_id(message):
+    """Первичный ключ строки из сообщения Debezium (after для c/u/r, before для d)."""
+    data = message.get('after') if message.get('op') in ['c', 'u', 'r'] else message.get('before')
+    return (data or {}).get('id')
+
+
+class Coalescer:
+    """
+    Окно last-write-wins для событий CDC: на каждую пару (table, id) остаётся
+    только последнее событие. Create + delete внутри окна сворачиваются в один delete:
+    при повторной доставке create мог быть уже применён, а delete идемпотентен.
+    """
+
+    def __init__(self):
+        self.events = {}
+        self.table_rows = {}
+        self.last_offset = None
+        # Накопительная статистика за всё время работы
+        self.received = 0
+        self.saved = 0
+        self._anonymous = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    def add(self, table_name, message, offset):
+        self.received += 1
+        if offset is not None and (self.last_offset is None or offset > self.last_offset):
+            self.last_offset = offset
+
+        object_id = event_id(message)
+        if object_id is None:
+            # Без первичного ключа склеивать нечего — пропускаем событие как есть
+            self._anonymous += 1
+            self._put((table_name, None, self._anonymous), table_name, message, offset)
+            return
+
+        key = (table_name, object_id)
+        previous = self.events.pop(key, None)
+        if previous is None:
+            self._put(key, table_name, message, offset)
+            return
+
+        self.saved += 1
+        previous_op = previous[0].get('op')
+        operation = message.get('op')
+
+        if previous_op == 'c' and operation == 'u':
+            message = {**message, 'op': 'c'}
+
+        # Переставляем ключ в конец, чтобы порядок соответствовал последнему событию
+        self.events[key] = (message, offset)
+
+    def _put(self, key, table_name, message, offset):
+        self.events[key] = (message, offset)
+        self.table_rows[table_name] = self.table_rows.get(table_name, 0) + 1
+
+    def drain(self):
+        """Возвращает накопленные события и максимальный offset окна, очищая окно."""
+        batch = list(self.events.values())
+        last_offset = self.last_offset
+        self.events = {}
+        self.table_rows = {}
+        self.last_offset = None
+        return batch, last_offset
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'saved': self.saved,
+            'pending': len(self.events),
+        }
@@ -1,11 +1,18 @@
 import base64
+import logging
 from datetime import datetime
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
 
 from .mapping import TABLE_MODEL_MAPPING, BASE64_FIELDS, TIME_FIELDS, FIELD_MAPPING, IGNORE_FIELDS
+from .transform import build_payload
+from ..http_cache import CATALOG_VERSIONS
+from ..models import DeadLetterEvent
 from channels.db import database_sync_to_async
 
+logger = logging.getLogger(__name__)
+
 class SyncDataFromDebezium:
 
 
@@ -18,7 +25,7 @@ class SyncDataFromDebezium:
                         int_value = int.from_bytes(bytes_data, byteorder='big')
                         data[field] = int_value / 100
                     except (ValueError, UnicodeDecodeError) as e:
-                        print(f"Ошибка декодирования Base64 для поля {field}: {e}")
+                        logger.warning("Ошибка декодирования Base64 для поля %s: %s", field, e)
         return data
 
 
@@ -33,31 +40,30 @@ class SyncDataFromDebezium:
                         seconds = int(seconds % 60)
                         data[field] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
                     except ValueError as e:
-                        print(f"Ошибка преобразования времени для поля {field}: {e}")
+                        logger.warning("Ошибка преобразования времени для поля %s: %s", field, e)
         return data
 
+    # Старый путь преобразования (create_payload + _prepare_data) оставлен для сравнения
+    # в bench_cdc_transform; в синхронизации используются планы из transform.py
     def _prepare_data(self, table_name, data):
         data = self._decode_base64_fields(table_name, data.copy())
         data = self._convert_time_fields(table_name, data)
         return data
 
-    @database_sync_to_async
-    def sync_data(self, message):
+    def apply_data(self, message):
         table_name = message.get('source', {}).get('table')
         operation = message.get('op')
         model_class = TABLE_MODEL_MAPPING.get(table_name)
         
         if not model_class:
-            print(f"Неизвестная таблица: {table_name}")
+            logger.warning("Неизвестная таблица: %s", table_name)
             return
         
-        payload = create_payload(message)
+        payload = build_payload(message)
         if not payload:
-            print(f"Нет данных для операции {operation} в таблице {table_name}")
+            logger.warning("Нет данных для операции %s в таблице %s", operation, table_name)
             return False
         
-        payload = self._prepare_data(table_name, payload)
-        
         try:
             if operation in ['c', 'r']:
                 
@@ -65,7 +71,7 @@ class SyncDataFromDebezium:
                     id=payload.get('id'),
                     defaults=payload
                 )
-                print(f"{'Создана' if created else 'Обновлена'} запись в {table_name}: {payload}")
+                logger.debug("%s запись в %s: %s", 'Создана' if created else 'Обновлена', table_name, payload)
             
             elif operation == 'u':
                 instance, created = model_class.objects.update_or_create(
@@ -73,26 +79,157 @@ class SyncDataFromDebezium:
                     defaults=payload
                 )
                 if created:
-                    print(f"Создана запись в {table_name}: {payload} по причине того, что не было найдено")
+                    logger.debug("Создана запись в %s: %s по причине того, что не было найдено", table_name, payload)
                 else:
-                    print(f"Обновлена запись в {table_name}: {payload}")
+                    logger.debug("Обновлена запись в %s: %s", table_name, payload)
             
             elif operation == 'd':
                 obj = model_class.objects.filter(id=payload.get('id')).first()
                 if obj:
                     obj.delete()
-                    print(f"Удалена запись в {obj.id}: {payload}")
+                    logger.debug("Удалена запись в %s: %s", obj.id, payload)
                 else:
-                    print(f"Запись для удаления не найдена в {table_name}: {payload}")
+                    logger.debug("Запись для удаления не найдена в %s: %s", table_name, payload)
             
             else:
-                print(f"Неизвестная операция: {operation} для таблицы {table_name}")
+                logger.warning("Неизвестная операция: %s для таблицы %s", operation, table_name)
                 return False
             return True
         except Exception as e:
-            print(f"Ошибка обработки данных для таблицы {table_name}: {e}")
+            logger.error("Ошибка обработки данных для таблицы %s: %s", table_name, e)
+            return False
+
+    def missing_parents(self, message):
+        """
+        Родительские строки, на которые ссылается событие, но которых ещё нет в БД:
+        список (model label, str(pk)). Для delete и неизвестных таблиц — пустой список.
+        """
+        table_name = message.get('source', {}).get('table')
+        model_class = TABLE_MODEL_MAPPING.get(table_name)
+        if model_class is None or message.get('op') == 'd':
+            return []
+
+        payload = build_payload(message) or {}
+        missing = []
+        for field in model_class._meta.concrete_fields:
+            if not field.is_relation:
+                continue
+            value = payload.get(field.attname, payload.get(field.name))
+            if value is None:
+                continue
+            parent_model = field.related_model
+            if not parent_model._default_manager.filter(pk=value).exists():
+                missing.append((parent_model._meta.label, str(value)))
+        return missing
+
+    def record_dead_letter(self, stream_name, message, offset, error, raw=''):
+        """Сохраняет неприменимое событие в DeadLetterEvent; False, если не удалось и это."""
+        message = message or {}
+        try:
+            DeadLetterEvent.objects.create(
+                stream=stream_name or '', offset=offset,
+                table_name=message.get('source', {}).get('table') or '', op=message.get('op') or '',
+                message=message or None, raw=raw, error=error,
+            )
+            return True
+        except Exception as e:
+            logger.error("Не удалось сохранить событие %s@%s в DeadLetterEvent: %s", stream_name, offset, e)
             return False
 
+    # Асинхронные обёртки для event loop'а; синхронные apply_* вызываются напрямую из потоков воркеров
+    @database_sync_to_async
+    def sync_data(self, message):
+        return self.apply_data(message)
+
+    def _group_batch(self, messages):
+        """
+        Раскладывает пачку по таблицам. Для каждой записи остаётся только последнее
+        состояние: upsert или delete.
+        """
+        upserts = {}
+        deletes = {}
+        for message in messages:
+            table_name = message.get('source', {}).get('table')
+            operation = message.get('op')
+
+            if table_name not in TABLE_MODEL_MAPPING:
+                logger.warning("Неизвестная таблица: %s", table_name)
+                continue
+
+            payload = build_payload(message)
+            if not payload:
+                logger.warning("Нет данных для операции %s в таблице %s", operation, table_name)
+                continue
+
+            object_id = payload.get('id')
+
+            if operation in ['c', 'r', 'u']:
+                upserts.setdefault(table_name, {})[object_id] = payload
+                deletes.get(table_name, set()).discard(object_id)
+            elif operation == 'd':
+                upserts.get(table_name, {}).pop(object_id, None)
+                deletes.setdefault(table_name, set()).add(object_id)
+            else:
+                logger.warning("Неизвестная операция: %s для таблицы %s", operation, table_name)
+
+        return upserts, deletes
+
+    def _bulk_upsert(self, model_class, payloads):
+        keys = set().union(*payloads)
+        update_fields = [
+            field.name for field in model_class._meta.concrete_fields
+            if not field.primary_key and (field.attname in keys or field.name in keys or getattr(field, 'auto_now', False))
+        ]
+        objs = [model_class(**payload) for payload in payloads]
+
+        if not update_fields:
+            model_class.objects.bulk_create(objs, ignore_conflicts=True)
+            return
+
+        # MySQL не принимает unique_fields: ON DUPLICATE KEY UPDATE сам берёт первичный ключ
+        unique_fields = ['id'] if connection.features.supports_update_conflicts_with_target else None
+        model_class.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            update_fields=update_fields,
+            unique_fields=unique_fields,
+        )
+
+    def apply_batch(self, messages):
+        """
+        Применяет пачку сообщений одной транзакцией: на каждую таблицу
+        один bulk upsert и один bulk delete.
+        """
+        upserts, deletes = self._group_batch(messages)
+
+        try:
+            with transaction.atomic():
+                # Родительские таблицы идут раньше дочерних (порядок TABLE_MODEL_MAPPING)
+                for table_name, model_class in TABLE_MODEL_MAPPING.items():
+                    if upserts.get(table_name):
+                        self._bulk_upsert(model_class, list(upserts[table_name].values()))
+
+                # Удаляем в обратном порядке: сначала дочерние записи
+                for table_name, model_class in reversed(TABLE_MODEL_MAPPING.items()):
+                    if deletes.get(table_name):
+                        model_class.objects.filter(id__in=deletes[table_name]).delete()
+
+                # bulk_create не шлёт сигналы: версии справочников для HTTP-кэша поднимаем сами
+                changed = [model_class for table_name, model_class in TABLE_MODEL_MAPPING.items()
+                           if upserts.get(table_name) or deletes.get(table_name)]
+                CATALOG_VERSIONS.bump_on_commit(*changed)
+
+            logger.debug("Применена пачка из %s сообщений: %s upsert, %s delete", len(messages),
+                         sum(len(rows) for rows in upserts.values()), sum(len(ids) for ids in deletes.values()))
+            return True
+        except Exception as e:
+            logger.error("Ошибка пакетной обработки (%s сообщений): %s", len(messages), e)
+            return False
+
+    @database_sync_to_async
+    def sync_batch(self, messages):
+        return self.apply_batch(messages)
+
 def create_payload(message):
     table_name = message.get('source', {}).get('table')
     operation = message.get('op')
@@ -0,0 +1,63 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson не обязателен, без него работает stdlib json
+    orjson = None
+
+
+def _stdlib_loads(view):
+    # stdlib json не принимает memoryview, здесь одна копия неизбежна
+    return json.loads(bytes(view))
+
+
+# name -> loads(memoryview); первый доступный бэкенд используется по умолчанию
+DECODER_BACKENDS = {}
+if orjson is not None:
+    DECODER_BACKENDS['orjson'] = orjson.loads
+DECODER_BACKENDS['json'] = _stdlib_loads
+
+
+def register_backend(name, loads):
+    """Подключает ещё один JSON-бэкенд. loads должен принимать memoryview."""
+    DECODER_BACKENDS[name] = loads
+
+
+class EnvelopeDecoder:
+    """
+    Достаёт payload Debezium из сырого сообщения стрима.
+    JSON ищется между первой '{' и последней '}' без копирования среза (memoryview).
+    Если конверт начинается с блока schema, разбирается только payload.
+    """
+
+    PAYLOAD_KEY = b'"payload":'
+    SCHEMA_KEY = b'"schema"'
+
+    def __init__(self, backend=None, skip_schema=True):
+        self.backend = backend or next(iter(DECODER_BACKENDS))
+        self.loads = DECODER_BACKENDS[self.backend]
+        self.skip_schema = skip_schema
+
+    def decode(self, msg):
+        """Возвращает словарь сообщения или None, если в сообщении нет JSON."""
+        start = msg.find(b'{')
+        end = msg.rfind(b'}')
+        if start == -1 or end == -1:
+            return None
+
+        view = memoryview(msg)
+        has_schema = msg.find(self.SCHEMA_KEY, start, start + 16) != -1
+
+        if has_schema and self.skip_schema:
+            payload_at = msg.find(self.PAYLOAD_KEY, start)
+            if payload_at != -1:
+                try:
+                    # Срез от значения payload до закрывающей скобки конверта
+                    return self.loads(view[payload_at + len(self.PAYLOAD_KEY):end])
+                except ValueError:
+                    pass  # payload оказался не последним ключом — разбираем конверт целиком
+
+        message = self.loads(view[start:end + 1])
+        if isinstance(message, dict) and 'schema' in message and 'payload' in message:
+            return message['payload']
+        return message
@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+
+from Shop.metrics import REGISTRY, Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_RECEIVED = REGISTRY.register(Counter(
+    'cdc_messages_received_total', "Сообщения, полученные из стрима", ['stream', 'table', 'op']))
+MESSAGES_APPLIED = REGISTRY.register(Counter(
+    'cdc_messages_applied_total', "Сообщения, применённые к БД", ['table', 'op']))
+MESSAGES_FAILED = REGISTRY.register(Counter(
+    'cdc_messages_failed_total', "Сообщения, которые не удалось применить", ['table', 'op']))
+DECODE_SECONDS = REGISTRY.register(Histogram(
+    'cdc_decode_seconds', "Время декодирования сообщения", ['stream']))
+APPLY_SECONDS = REGISTRY.register(Histogram(
+    'cdc_apply_seconds', "Время применения пачки или сообщения", ['table']))
+QUEUE_LAG_SECONDS = REGISTRY.register(Histogram(
+    'cdc_queue_lag_seconds', "Ожидание задания в очереди шарда", ['shard']))
+SHARD_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'cdc_shard_queue_depth', "Заданий в очереди шарда, ещё не взятых в работу", ['shard']))
+DEAD_LETTERED = REGISTRY.register(Counter(
+    'cdc_messages_dead_lettered_total', "Сообщения, отложенные в DeadLetterEvent", ['table', 'op']))
+OFFSET_LAG = REGISTRY.register(Gauge(
+    'cdc_offset_lag', "Полученный offset минус сохранённый checkpoint", ['stream']))
+
+
+class LogExporter:
+    """Экспортёр, который раз в interval секунд пишет в лог одну строку со сводкой."""
+
+    def __init__(self, interval=60, registry=REGISTRY):
+        self.interval = interval
+        self.registry = registry
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True, name="cdc-metrics-log").start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            logger.info(self.summary())
+
+    def summary(self):
+        apply_count, apply_total = APPLY_SECONDS.totals()
+        decode_count, decode_total = DECODE_SECONDS.totals()
+        return (
+            f"cdc: received={MESSAGES_RECEIVED.total()} applied={MESSAGES_APPLIED.total()} "
+            f"failed={MESSAGES_FAILED.total()} "
+            f"avg_decode_ms={decode_total / decode_count * 1000 if decode_count else 0:.3f} "
+            f"avg_apply_ms={apply_total / apply_count * 1000 if apply_count else 0:.2f}"
+        )
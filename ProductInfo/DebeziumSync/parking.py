@@ -0,0 +1,157 @@
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ParkingLot:
+    """
+    Стоянка для событий, чьи родительские строки (FK) ещё не закоммичены.
+    Событие возвращается в работу, как только закоммичены все его родители.
+    Пока у строки (table, id) есть событие на стоянке, более новые события той же строки
+    встают за ним (park_behind) и возвращаются вместе с ним в порядке offset'ов,
+    иначе старое событие применилось бы поверх нового.
+    Размер ограничен max_size (вытесняются самые старые строки целиком, park() их возвращает),
+    ожидание — ttl секунд: по истечении события строки получают последнюю попытку.
+
+    item — кортеж (message, offset, stream_name), родитель — (model label, str(pk)),
+    строка — (table_name, str(pk)).
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.waiting = {}
+        self.rows = {}
+        self.parked = 0
+        self.released = 0
+        self.expired = 0
+        self.evicted = 0
+        self.superseded = 0
+        self._next_key = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def holds(self, row):
+        return row in self.rows
+
+    def park(self, item, missing, row):
+        """Паркует событие до коммита родителей missing; возвращает вытесненные события."""
+        key = self._add(item, set(missing), row)
+        for parent in missing:
+            self.waiting.setdefault(parent, set()).add(key)
+        return self._evict()
+
+    def park_behind(self, item, row):
+        """Ставит событие за уже припаркованными событиями той же строки; возвращает вытесненные."""
+        self._add(item, set(), row)
+        return self._evict()
+
+    def release(self, committed):
+        """
+        Отдаёт события строк, у которых после коммита committed не осталось недостающих
+        родителей, вместе с событиями, стоявшими за ними, — по возрастанию offset'а.
+        """
+        ready_rows = []
+        for parent in committed:
+            for key in self.waiting.pop(parent, ()):
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                entry[1].discard(parent)
+                if not entry[1]:
+                    ready_rows.append(entry[3])
+
+        ready = []
+        for row in ready_rows:
+            keys = self.rows.get(row, [])
+            # Строка свободна, только когда родители есть у всех её событий
+            if any(self.entries[key][1] for key in keys):
+                continue
+            ready.extend(self._take_row(row))
+        self.released += len(ready)
+        return sort_by_offset(ready)
+
+    def expire(self):
+        """Снимает со стоянки строки, чьё первое событие старше ttl, и отдаёт их на последнюю попытку."""
+        deadline = time.monotonic() - self.ttl
+        expired = []
+        while self.entries:
+            item, missing, parked_at, row = next(iter(self.entries.values()))
+            if parked_at > deadline:
+                break
+            expired.extend(self._take_row(row))
+        self.expired += len(expired)
+        return sort_by_offset(expired)
+
+    def supersede(self, row, offset):
+        """Убирает события строки старше offset: применено более новое событие, старые устарели."""
+        if offset is None:
+            return
+        for key in list(self.rows.get(row, ())):
+            item_offset = self.entries[key][0][1]
+            if item_offset is not None and item_offset < offset:
+                self._unlink(key)
+                self.superseded += 1
+
+    def min_offset(self, stream_name):
+        """Наименьший offset стрима на стоянке: checkpoint не должен уйти дальше него."""
+        offsets = [
+            item[1] for item, _, _, _ in self.entries.values()
+            if item[2] == stream_name and item[1] is not None
+        ]
+        return min(offsets, default=None)
+
+    def _add(self, item, missing, row):
+        self._next_key += 1
+        key = self._next_key
+        self.entries[key] = (item, missing, time.monotonic(), row)
+        self.rows.setdefault(row, []).append(key)
+        self.parked += 1
+        return key
+
+    def _evict(self):
+        evicted = []
+        while len(self.entries) > self.max_size:
+            item, missing, _, row = next(iter(self.entries.values()))
+            items = self._take_row(row)
+            logger.warning("Стоянка переполнена: вытеснено %s событий %s, нет родителей %s",
+                           len(items), row, sorted(missing))
+            evicted.extend(items)
+        self.evicted += len(evicted)
+        return evicted
+
+    def _take_row(self, row):
+        return [self._unlink(key) for key in list(self.rows.get(row, ()))]
+
+    def _unlink(self, key):
+        item, missing, _, row = self.entries.pop(key)
+        for parent in missing:
+            keys = self.waiting.get(parent)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.waiting[parent]
+        keys = self.rows[row]
+        keys.remove(key)
+        if not keys:
+            del self.rows[row]
+        return item
+
+    def stats(self):
+        return {
+            'parked_now': len(self.entries),
+            'parked': self.parked,
+            'released': self.released,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'superseded': self.superseded,
+        }
+
+
+def sort_by_offset(items):
+    # События без offset'а (снимок без позиции) — в исходном порядке, перед остальными
+    return sorted(items, key=lambda item: -1 if item[1] is None else item[1])
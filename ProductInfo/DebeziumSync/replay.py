@@ -0,0 +1,47 @@
+from rstream import OffsetNotFound
+
+
+class ReplayMessageContext:
+    def __init__(self, stream, offset):
+        self.stream = stream
+        self.offset = offset
+
+
+class ReplayConsumer:
+    """
+    In-process замена rstream.Consumer: отдаёт записанные сообщения подписчикам
+    в том же виде (bytes + контекст с offset), в каком их отдаёт стрим.
+    Сохранённые offset'ы остаются в stored_offsets.
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.stored_offsets = {}
+        self.store_offset_calls = 0
+        self._subscribers = []
+
+    async def create_stream(self, stream, arguments=None, exists_ok=False):
+        pass
+
+    async def query_offset(self, stream, subscriber_name):
+        if (stream, subscriber_name) not in self.stored_offsets:
+            raise OffsetNotFound(f"No offset stored for {subscriber_name} on {stream}")
+        return self.stored_offsets[(stream, subscriber_name)]
+
+    async def start(self):
+        pass
+
+    async def subscribe(self, stream, subscriber_name, callback, offset_specification=None, **kwargs):
+        self._subscribers.append((stream, callback))
+
+    async def run(self):
+        for offset, msg in enumerate(self.messages):
+            for stream, callback in self._subscribers:
+                await callback(msg, ReplayMessageContext(stream, offset))
+
+    async def store_offset(self, stream, offset, subscriber_name):
+        self.store_offset_calls += 1
+        self.stored_offsets[(stream, subscriber_name)] = offset
+
+    async def close(self):
+        pass
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from .coalescing import event_id
+from .mapping import TABLE_MODEL_MAPPING
+from .metrics import (
+    APPLY_SECONDS, DEAD_LETTERED, MESSAGES_APPLIED, MESSAGES_FAILED, QUEUE_LAG_SECONDS, SHARD_QUEUE_DEPTH,
+)
+from .parking import ParkingLot, sort_by_offset
+
+logger = logging.getLogger(__name__)
+
+
+def dependency_levels():
+    """
+    Таблицы TABLE_MODEL_MAPPING, разложенные по уровням внешних ключей: таблица стоит
+    на уровень ниже всех своих родителей. Таблицы одного уровня друг от друга не зависят.
+    """
+    table_of = {model: table_name for table_name, model in TABLE_MODEL_MAPPING.items()}
+    levels = {}
+
+    def level(table_name):
+        if table_name not in levels:
+            model = TABLE_MODEL_MAPPING[table_name]
+            parents = [table_of[field.related_model] for field in model._meta.concrete_fields
+                       if field.is_relation and field.related_model in table_of and field.related_model is not model]
+            levels[table_name] = 1 + max((level(parent) for parent in parents), default=-1)
+        return levels[table_name]
+
+    grouped = {}
+    for table_name in TABLE_MODEL_MAPPING:
+        grouped.setdefault(level(table_name), []).append(table_name)
+    return [grouped[index] for index in sorted(grouped)]
+
+
+TABLE_LEVELS = dependency_levels()
+
+
+def row_key(table_name, message):
+    """Строка события для стоянки: (table, str(pk))."""
+    return table_name, str(event_id(message))
+
+
+class ApplyShard:
+    """
+    Воркер применения: своя очередь и свой поток, а значит и своё соединение с БД.
+    Задания внутри шарда выполняются строго по очереди.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"cdc-shard-{index}")
+        self.pending_events = 0
+        self.applied = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, job, messages):
+        future = asyncio.get_running_loop().create_future()
+        self.pending_events += len(messages)
+        await self.queue.put((job, messages, future, time.monotonic()))
+        SHARD_QUEUE_DEPTH.set(self.queue.qsize(), shard=self.index)
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, messages, future, enqueued_at = await self.queue.get()
+            SHARD_QUEUE_DEPTH.set(self.queue.qsize(), shard=self.index)
+            QUEUE_LAG_SECONDS.observe(time.monotonic() - enqueued_at, shard=self.index)
+            try:
+                result = await loop.run_in_executor(self.executor, self._call, job, messages)
+            except Exception as e:
+                logger.exception("Ошибка в шарде %s: %s", self.index, e)
+                result = False
+
+            self.pending_events -= len(messages)
+            if result is False:
+                self.failed += len(messages)
+            else:
+                self.applied += len(messages)
+            self.last_lag = time.monotonic() - enqueued_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _call(job, messages):
+        # Как database_sync_to_async: не держим протухшие соединения между заданиями
+        close_old_connections()
+        try:
+            return job(messages)
+        finally:
+            close_old_connections()
+
+    def stats(self):
+        return {
+            'shard': self.index,
+            'queue_depth': self.queue.qsize(),
+            'pending_events': self.pending_events,
+            'applied': self.applied,
+            'failed': self.failed,
+            'last_lag_ms': round(self.last_lag * 1000, 2),
+            'max_lag_ms': round(self.max_lag * 1000, 2),
+        }
+
+
+class ShardedApplier:
+    """
+    Раскладывает пачку событий по шардам по хэшу (table, id).
+    Одна строка всегда попадает в один шард, поэтому порядок по строке сохраняется,
+    а разные строки и независимые таблицы (один уровень TABLE_LEVELS) применяются параллельно.
+    События, чьи родители (FK) ещё не пришли, паркуются и применяются после коммита родителя;
+    более новые события той же строки паркуются за ними, чтобы не обогнать их.
+    События, которые не применились, не ждут родителя или вытеснены с переполненной стоянки,
+    сохраняются в DeadLetterEvent. Checkpoint держится (min_offset) на припаркованных событиях,
+    на событиях, которые сейчас пишутся в DeadLetterEvent, и на тех, что не удалось сохранить
+    даже туда (БД недоступна): их запись повторяется раз в maintenance_interval.
+    Там же истекает срок стоянки, так что без новых пачек удержание тоже снимается.
+
+    Каждый шард коммитит свою часть пачки отдельной транзакцией, поэтому пачка целиком уже
+    не атомарна: при сбое одного шарда остальные части остаются в БД. apply() тогда возвращает
+    False, checkpoint не сдвигается за пачку, и после перезапуска она доставляется заново —
+    upsert и delete идемпотентны, так что повтор доводит пачку до конца.
+    """
+
+    def __init__(self, handler, workers=4, parking_max_size=10000, parking_ttl=60, maintenance_interval=1.0):
+        self.handler = handler
+        self.shards = [ApplyShard(index) for index in range(max(1, workers))]
+        self.parking = ParkingLot(parking_max_size, parking_ttl)
+        self.maintenance_interval = maintenance_interval
+        # (message, offset, stream_name, error, raw), которые не удалось записать в DeadLetterEvent
+        self.unresolved = []
+        # То же, но запись в DeadLetterEvent ещё идёт: checkpoint держится и на них
+        self.dead_letters_in_flight = []
+        self.dead_lettered = 0
+        self.dead_letter_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cdc-dead-letter")
+        self._maintenance = None
+
+    def start(self):
+        for shard in self.shards:
+            shard.start()
+        self._maintenance = asyncio.create_task(self._run_maintenance())
+
+    def close(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            self._maintenance = None
+        for shard in self.shards:
+            shard.close()
+        self.dead_letter_executor.shutdown(wait=False)
+
+    def min_offset(self, stream_name):
+        """Наименьший offset стрима, который ещё не разрешён: на стоянке или не записан в DeadLetterEvent."""
+        offsets = [entry[1] for entry in self.unresolved + self.dead_letters_in_flight
+                   if entry[2] == stream_name and entry[1] is not None]
+        parked = self.parking.min_offset(stream_name)
+        if parked is not None:
+            offsets.append(parked)
+        return min(offsets, default=None)
+
+    def shard_for(self, table_name, object_id):
+        key = f"{table_name}:{object_id}".encode()
+        return self.shards[zlib.crc32(key) % len(self.shards)]
+
+    async def apply(self, batch, stream_name=None):
+        """
+        Применяет пачку [(message, offset)] и возвращает True, если каждое событие закоммичено,
+        припарковано или сохранено в DeadLetterEvent. False — что-то не удалось даже сохранить:
+        такие offset'ы удерживает min_offset(), поэтому checkpoint можно двигать в любом случае.
+        Таблицы идут уровнями: upsert от родителей к детям, delete в обратном порядке,
+        чтобы дочерняя строка не опережала родительскую в соседнем шарде; таблицы
+        одного уровня применяются одновременно.
+        """
+        return await self._apply_items([(message, offset, stream_name) for message, offset in batch])
+
+    async def maintain(self):
+        """Истёкшие события стоянки — на последнюю попытку, несохранённые — снова в DeadLetterEvent."""
+        # Последняя попытка для событий, которые не дождались родителя за ttl
+        expired = self.parking.expire()
+        if expired:
+            await self._apply_items(expired, park=False)
+        if self.unresolved:
+            entries, self.unresolved = self.unresolved, []
+            await self.dead_letter(entries)
+
+    async def _run_maintenance(self):
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.exception("Ошибка обслуживания стоянки CDC: %s", e)
+
+    async def dead_letter(self, entries):
+        """
+        Сохраняет [(message, offset, stream_name, error, raw)] в DeadLetterEvent.
+        Несохранённые остаются в unresolved и держат checkpoint; возвращает True, если сохранено всё.
+        """
+        if not entries:
+            return True
+        self.dead_letters_in_flight.extend(entries)
+        try:
+            failed = await asyncio.get_running_loop().run_in_executor(
+                self.dead_letter_executor, ApplyShard._call, self._record_dead_letters, entries)
+        except Exception as e:
+            logger.exception("Ошибка записи в DeadLetterEvent: %s", e)
+            failed = entries
+        finally:
+            for entry in entries:
+                self.dead_letters_in_flight.remove(entry)
+        self.unresolved.extend(failed)
+        for message, _, _, _, _ in entries:
+            message = message or {}
+            DEAD_LETTERED.inc(table=message.get('source', {}).get('table'), op=message.get('op'))
+        self.dead_lettered += len(entries) - len(failed)
+        return not failed
+
+    def _record_dead_letters(self, entries):
+        return [
+            entry for entry in entries
+            if not self.handler.record_dead_letter(entry[2], entry[0], entry[1], entry[3], entry[4])
+        ]
+
+    async def _apply_items(self, items, park=True):
+        upserts = {}
+        deletes = {}
+        evicted = []
+        for item in self._latest_per_row(items):
+            table_name = item[0].get('source', {}).get('table')
+            if table_name not in TABLE_MODEL_MAPPING:
+                logger.warning("Неизвестная таблица: %s", table_name)
+                continue
+            row = row_key(table_name, item[0])
+            if park and self.parking.holds(row):
+                # У строки есть событие на стоянке: новое не должно его обогнать
+                evicted.extend(self.parking.park_behind(item, row))
+                continue
+            target = deletes if item[0].get('op') == 'd' else upserts
+            target.setdefault(table_name, []).append(item)
+
+        success = await self.dead_letter([(*item, "Вытеснено с переполненной стоянки", '') for item in evicted])
+        committed = []
+        for level in TABLE_LEVELS:
+            results = await asyncio.gather(
+                *(self._apply_level(table_name, upserts.get(table_name), park, committed) for table_name in level))
+            success &= all(results)
+        for level in reversed(TABLE_LEVELS):
+            results = await asyncio.gather(
+                *(self._apply_level(table_name, deletes.get(table_name), park, committed) for table_name in level))
+            success &= all(results)
+
+        # Родители закоммичены — дождавшиеся их события применяем сразу
+        ready = self.parking.release(committed)
+        if ready:
+            success &= await self._apply_items(ready)
+        return success
+
+    @staticmethod
+    def _latest_per_row(items):
+        """
+        Последнее по offset'у событие каждой строки: события со стоянки возвращаются вместе
+        с более новыми событиями строки, и применять нужно только итоговое состояние.
+        """
+        latest = {}
+        for item in sort_by_offset(items):
+            table_name = item[0].get('source', {}).get('table')
+            object_id = event_id(item[0])
+            key = (table_name, str(object_id)) if object_id is not None else (table_name, None, len(latest))
+            latest.pop(key, None)
+            latest[key] = item
+        return list(latest.values())
+
+    async def _apply_level(self, table_name, items, park, committed):
+        if not items:
+            return True
+
+        by_shard = {}
+        for item in items:
+            shard = self.shard_for(table_name, event_id(item[0]))
+            by_shard.setdefault(shard, []).append(item)
+
+        shard_items = list(by_shard.items())
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(shard.submit(self._apply_with_fallback, [item[0] for item in shard_batch])
+              for shard, shard_batch in shard_items)
+        )
+        APPLY_SECONDS.observe(time.perf_counter() - started, table=table_name)
+
+        dead = []
+        model_label = TABLE_MODEL_MAPPING[table_name]._meta.label
+        for (shard, shard_batch), outcomes in zip(shard_items, results):
+            if outcomes is False:
+                outcomes = [False] * len(shard_batch)
+            for item, outcome in zip(shard_batch, outcomes):
+                if outcome is None:
+                    MESSAGES_APPLIED.inc(table=table_name, op=item[0].get('op'))
+                    self.parking.supersede(row_key(table_name, item[0]), item[1])
+                    if item[0].get('op') != 'd':
+                        committed.append((model_label, str(event_id(item[0]))))
+                elif outcome and park:
+                    for evicted in self.parking.park(item, outcome, row_key(table_name, item[0])):
+                        dead.append((*evicted, "Вытеснено с переполненной стоянки", ''))
+                elif outcome:
+                    logger.warning("Событие %s offset=%s: родители %s не пришли за %s с",
+                                   table_name, item[1], outcome, self.parking.ttl)
+                    dead.append((*item, f"Нет родителей {sorted(outcome)} за {self.parking.ttl} с", ''))
+                else:
+                    MESSAGES_FAILED.inc(table=table_name, op=item[0].get('op'))
+                    dead.append((*item, "Не удалось применить ни пачкой, ни по одному", ''))
+        return await self.dead_letter(dead)
+
+    def _apply_with_fallback(self, messages):
+        """
+        Выполняется в потоке шарда. Результат по каждому сообщению:
+        None — применено, список (model, pk) — не хватает родителей, False — ошибка.
+        """
+        if self.handler.apply_batch(messages):
+            return [None] * len(messages)
+        # Пачка шарда откатилась — применяем по одному, чтобы одна плохая строка не блокировала остальные
+        outcomes = []
+        for message in messages:
+            if self.handler.apply_data(message):
+                outcomes.append(None)
+            else:
+                outcomes.append(self.handler.missing_parents(message) or False)
+        return outcomes
+
+    def stats(self):
+        return [shard.stats() for shard in self.shards]
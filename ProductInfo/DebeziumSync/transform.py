@@ -0,0 +1,88 @@
+import base64
+import logging
+
+from .mapping import TABLE_MODEL_MAPPING, BASE64_FIELDS, TIME_FIELDS, FIELD_MAPPING, IGNORE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def decode_base64_decimal(value):
+    """Debezium отдаёт DECIMAL как base64 big-endian числа в копейках."""
+    try:
+        return int.from_bytes(base64.b64decode(value), byteorder='big') / 100
+    except (ValueError, UnicodeDecodeError) as e:
+        logger.warning("Ошибка декодирования Base64 значения %s: %s", value, e)
+        return value
+
+
+def convert_micros_to_time(value):
+    """Debezium отдаёт TIME как микросекунды от полуночи."""
+    try:
+        seconds = value / 1_000_000
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        seconds = int(seconds % 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    except (TypeError, ValueError) as e:
+        logger.warning("Ошибка преобразования времени %s: %s", value, e)
+        return value
+
+
+def compile_plan(table_name):
+    """
+    Собирает план преобразования таблицы: список (source_key, target_key, converter).
+    Колонки из FIELD_MAPPING переименовываются; остальные колонки модели (name и attname)
+    проходят без изменений, как в create_payload. Поля, которых нет в модели, отбрасываются.
+    """
+    model_class = TABLE_MODEL_MAPPING[table_name]
+    model_fields = []
+    for field in model_class._meta.concrete_fields:
+        model_fields.append(field.name)
+        if field.attname != field.name:
+            model_fields.append(field.attname)
+
+    mapping = FIELD_MAPPING.get(table_name, {})
+    # Как _prepare_data: конвертеры выбираются по имени поля уже после переименования
+    base64_fields = set(BASE64_FIELDS.get(table_name, []))
+    time_fields = set(TIME_FIELDS.get(table_name, []))
+
+    pairs = [(source_key, target_key) for source_key, target_key in mapping.items() if target_key in model_fields]
+    pairs += [(key, key) for key in model_fields if key not in mapping]
+
+    plan = []
+    for source_key, target_key in pairs:
+        if source_key in IGNORE_FIELDS:
+            continue
+        converter = None
+        if target_key in base64_fields:
+            converter = decode_base64_decimal
+        elif target_key in time_fields:
+            converter = convert_micros_to_time
+        plan.append((source_key, target_key, converter))
+    return plan
+
+
+def apply_plan(plan, data):
+    """Проекция, переименование и конвертация за один проход по плану."""
+    payload = {}
+    for source_key, target_key, converter in plan:
+        if source_key in data:
+            value = data[source_key]
+            payload[target_key] = converter(value) if converter is not None and value else value
+    return payload
+
+
+# Планы собираются один раз при импорте — обработчик импортируется после загрузки приложений
+TRANSFORM_PLANS = {table_name: compile_plan(table_name) for table_name in TABLE_MODEL_MAPPING}
+
+
+def build_payload(message):
+    """Готовый payload для модели из сообщения Debezium или None, если данных нет."""
+    table_name = message.get('source', {}).get('table')
+    operation = message.get('op')
+    data = message.get('after') if operation in ['c', 'u', 'r'] else message.get('before')
+
+    plan = TRANSFORM_PLANS.get(table_name)
+    if not data or plan is None:
+        return None
+    return apply_plan(plan, data)
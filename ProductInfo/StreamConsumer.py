@@ -1,29 +1,113 @@
 import asyncio
-import json
+import logging
 from rstream import Consumer, ConsumerOffsetSpecification, OffsetType, OffsetNotFound
 import threading
+import atexit
+import time
 import pprint
 from . import get_sync_handler
+from .DebeziumSync.batching import BatchBuffer
+from .DebeziumSync.sharding import ShardedApplier
+from .DebeziumSync.decoding import EnvelopeDecoder
+from .DebeziumSync.checkpoint import Checkpointer
+from .DebeziumSync.bootstrap import SnapshotLoader
+from .DebeziumSync.metrics import MESSAGES_RECEIVED, MESSAGES_APPLIED, MESSAGES_FAILED, DECODE_SECONDS, \
+    APPLY_SECONDS, OFFSET_LAG
 from channels.db import aclose_old_connections
 
+logger = logging.getLogger(__name__)
+
 class ConsumerPool:
-    def __init__(self):
+    def __init__(self, batch_size=500, batch_timeout_ms=200, apply_workers=4, json_backend=None,
+                 checkpoint_every=1000, checkpoint_interval=5.0, bootstrap=False, bootstrap_batch_size=5000,
+                 parking_max_size=10000, parking_ttl=60):
         self.consumers = []
         self.sync_handler = get_sync_handler()()
         self.message_counter = 0
         self.CLOSE_CONNECTION_INTERVAL = 100  # Закрывать соединения каждые 100 сообщений
+        # Пакетный режим: batch_size=None отключает его и возвращает применение по одному сообщению
+        self.batch_size = batch_size
+        self.batch_timeout_ms = batch_timeout_ms
+        self.buffers = {}
+        # Пачки применяются шардами по (table, id), у каждого шарда свой поток и своё соединение с БД
+        self.apply_workers = apply_workers
+        self.applier = None
+        # События без родителя (FK) ждут его на стоянке не дольше parking_ttl секунд
+        self.parking_max_size = parking_max_size
+        self.parking_ttl = parking_ttl
+        # orjson, если установлен, иначе stdlib json
+        self.decoder = EnvelopeDecoder(json_backend)
+        # Checkpoint offset'а: каждые checkpoint_every сообщений, раз в checkpoint_interval секунд и при остановке
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpointers = {}
+        self.loop = None
+        self.tasks = []
+        # Режим первичной загрузки для стримов, которые читаются с OffsetType.FIRST
+        self.bootstrap = bootstrap
+        self.bootstrap_batch_size = bootstrap_batch_size
+        self.snapshot_loader = None
+        self.bootstrap_streams = set()
 
-    def add_consumer(self, config):
-        consumer = Consumer(host="rabbit-container", port=5552, username="user", password="password")
+    def add_consumer(self, config, consumer=None):
+        # consumer можно подменить, например ReplayConsumer для локального прогона записанных сообщений
+        if consumer is None:
+            consumer = Consumer(host="rabbit-container", port=5552, username="user", password="password")
         self.consumers.append((consumer, config))
 
 
+    def coalescing_stats(self):
+        """Сколько записей сэкономило склеивание событий, по каждому стриму."""
+        return {stream_name: buffer.coalescer.stats() for stream_name, buffer in self.buffers.items()}
+
+    def shard_stats(self):
+        """Глубина очереди и лаг применения по каждому шарду."""
+        return self.applier.stats() if self.applier else []
+
+    def parking_stats(self):
+        if not self.applier:
+            return {}
+        return {**self.applier.parking.stats(), 'dead_lettered': self.applier.dead_lettered,
+                'unresolved': len(self.applier.unresolved)}
+
+    def checkpoint_stats(self):
+        return {stream_name: checkpointer.stats() for stream_name, checkpointer in self.checkpointers.items()}
+
     async def start(self):
-        tasks = []
+        self.loop = asyncio.get_running_loop()
+        self.applier = ShardedApplier(self.sync_handler, self.apply_workers, self.parking_max_size, self.parking_ttl)
+        self.applier.start()
+        if self.bootstrap:
+            self.snapshot_loader = SnapshotLoader(self.bootstrap_batch_size)
+        self.tasks = []
         for consumer, config in self.consumers:
             task = asyncio.create_task(self.run_consumer(consumer, config))
-            tasks.append(task)
-        await asyncio.gather(*tasks)
+            self.tasks.append(task)
+        try:
+            await asyncio.gather(*self.tasks)
+        finally:
+            self.applier.close()
+            if self.snapshot_loader is not None:
+                self.snapshot_loader.close()
+
+    async def stop(self, timeout=10):
+        """Останавливает потребителей и ждёт, пока они допишут буферы и сохранят checkpoint."""
+        for consumer, config in self.consumers:
+            try:
+                await consumer.close()
+            except Exception as e:
+                logger.error("Error closing consumer %s: %s", config['name'], e)
+        if self.tasks:
+            await asyncio.wait(self.tasks, timeout=timeout)
+
+    def shutdown(self, timeout=10):
+        """Синхронная остановка из другого потока (atexit)."""
+        if self.loop is None or not self.loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.stop(timeout), self.loop).result(timeout + 1)
+        except Exception as e:
+            logger.error("Error during consumer pool shutdown: %s", e)
 
     async def run_consumer(self, consumer, config):
         stream_name = config["name"]
@@ -39,7 +123,7 @@ class ConsumerPool:
             }
             await consumer.create_stream(stream_name, arguments=stream_arguments, exists_ok=True)
         except Exception as e:
-            print(f"Stream {stream_name} already exists or error: {e}")
+            logger.info("Stream %s already exists or error: %s", stream_name, e)
             # Продолжаем работу даже если поток уже существует
         
 
@@ -48,11 +132,75 @@ class ConsumerPool:
             stored_offset = await consumer.query_offset(stream=stream_name, subscriber_name=subscriber_name)
             start_offset = stored_offset + 1  # Начать с следующего сообщения
             offset_spec = ConsumerOffsetSpecification(OffsetType.OFFSET, start_offset)
-            print(f"Starting from offset: {start_offset}")
+            logger.info("Starting from offset: %s", start_offset)
         except OffsetNotFound:
             offset_spec = ConsumerOffsetSpecification(OffsetType.FIRST)  # Начать с начала, если оффсет не найден
-            print(f"Starting from beginning of stream")
+            logger.info("Starting from beginning of stream")
+            if self.snapshot_loader is not None:
+                self.bootstrap_streams.add(stream_name)
+                logger.info("Bootstrap mode enabled for stream %s", stream_name)
         
+        async def store_offset(offset):
+            try:
+                logger.debug("Storing offset: %s for stream %s", offset, stream_name)
+                await consumer.store_offset(
+                    stream=stream_name,
+                    offset=offset,
+                    subscriber_name=subscriber_name
+                )
+            except Exception as e:
+                logger.error("Error storing offset: %s", e)
+                raise
+
+        # Offset сохраняется по расписанию, а не на каждое сообщение
+        checkpointer = Checkpointer(
+            store_offset, self.checkpoint_every, self.checkpoint_interval,
+            hold=lambda: self.applier.min_offset(stream_name)
+        )
+        self.checkpointers[stream_name] = checkpointer
+
+        async def flush_batch(batch, window_offset):
+            # Шарды сами откатываются на применение по одному, события без родителя паркуются,
+            # неприменимые уходят в DeadLetterEvent; checkpoint не уйдёт дальше неразрешённых (hold)
+            if not batch or await self.applier.apply(batch, stream_name):
+                stats = buffer.coalescer.stats()
+                logger.debug("Synced batch of %s messages from stream %s, coalescing saved %s of %s writes so far",
+                             len(batch), stream_name, stats['saved'], stats['received'])
+            else:
+                logger.error("Batch of %s messages from stream %s was not fully applied or dead-lettered",
+                             len(batch), stream_name)
+            await checkpointer.advance(window_offset, len(batch))
+
+        buffer = BatchBuffer(flush_batch, self.batch_size, self.batch_timeout_ms) if self.batch_size else None
+        if buffer is not None:
+            self.buffers[stream_name] = buffer
+
+        async def load_snapshot(batch, window_offset):
+            messages = [message for message, _ in batch]
+            if not messages or await self.snapshot_loader.load(messages):
+                for message in messages:
+                    MESSAGES_APPLIED.inc(table=message.get('source', {}).get('table'), op='r')
+            else:
+                # Пачку снимка не удалось вставить — применяем обычным upsert'ом
+                await self.applier.apply(batch, stream_name)
+            await checkpointer.advance(window_offset, len(batch))
+
+        snapshot_buffer = None
+        if stream_name in self.bootstrap_streams:
+            snapshot_buffer = BatchBuffer(load_snapshot, self.bootstrap_batch_size, 1000)
+
+        async def finish_bootstrap():
+            nonlocal snapshot_buffer
+            if snapshot_buffer is None:
+                return
+            await snapshot_buffer.flush()
+            snapshot_buffer = None
+            self.bootstrap_streams.discard(stream_name)
+            logger.info("Bootstrap finished for stream %s, switching to incremental apply", stream_name)
+            # Внешние ключи проверяем, когда первичную загрузку закончили все стримы
+            if not self.bootstrap_streams:
+                await self.snapshot_loader.finish()
+
         # Определить обработчик сообщений
         async def on_message(msg, message_context):
             try:
@@ -60,38 +208,59 @@ class ConsumerPool:
                 if self.message_counter % self.CLOSE_CONNECTION_INTERVAL == 0:
                     self.message_counter = 0
                     await aclose_old_connections()
-                # Найти первую и последнюю фигурную скобку
-                json_start = msg.find(b'{')
-                json_end = msg.rfind(b'}')
-                if json_start == -1 or json_end == -1:
-                    print("JSON braces not found in messagek")
-                    return 
-                json_bytes = msg[json_start:json_end+1]
-                json_msg = json.loads(json_bytes)
-                print(f"Received JSON message: {json_msg} from stream {stream_name}")
+                started = time.perf_counter()
+                json_msg = self.decoder.decode(msg)
+                DECODE_SECONDS.observe(time.perf_counter() - started, stream=stream_name)
+                if not json_msg:
+                    logger.warning("JSON braces not found in message")
+                    # В пакетном режиме offset пропущенного сообщения покроет offset окна
+                    if buffer is None:
+                        await checkpointer.advance(message_context.offset)
+                    return
+                # Печать всего payload'а только на уровне DEBUG
+                logger.debug("Received JSON message: %s from stream %s", json_msg, stream_name)
+                table_name = json_msg.get('source', {}).get('table')
+                operation = json_msg.get('op')
+                MESSAGES_RECEIVED.inc(stream=stream_name, table=table_name, op=operation)
+                if message_context.offset is not None:
+                    stored = checkpointer.stored if checkpointer.stored is not None else -1
+                    OFFSET_LAG.set(message_context.offset - stored, stream=stream_name)
+
+                if snapshot_buffer is not None:
+                    if operation == 'r':
+                        await snapshot_buffer.add(table_name, json_msg, message_context.offset)
+                        # Debezium помечает последнюю строку снимка snapshot='last'
+                        if json_msg.get('source', {}).get('snapshot') == 'last':
+                            await finish_bootstrap()
+                        return
+                    # Пошли события стриминга — переключаемся на обычное применение
+                    await finish_bootstrap()
 
+                if buffer is not None:
+                    await buffer.add(table_name, json_msg, message_context.offset)
+                    return
+
+                started = time.perf_counter()
                 success = await self.sync_handler.sync_data(json_msg)
- 
-                # Сохранить offset только после успешной обработки
-                if success and message_context.offset:
-                    try:
-                        print(f"Storing offset: {message_context.offset} for stream {stream_name}")
-                        print(f"Synced data from stream {stream_name}")
-
-                        await consumer.store_offset(
-                            stream=stream_name,
-                            offset=message_context.offset,
-                            subscriber_name=subscriber_name
-                        )
-                    except Exception as e:
-                        print(f"Error storing offset: {e}")
-                        print(f"Failed to sync data from stream {stream_name}")
+                APPLY_SECONDS.observe(time.perf_counter() - started, table=table_name)
 
+                if success:
+                    MESSAGES_APPLIED.inc(table=table_name, op=operation)
+                    logger.debug("Synced data from stream %s", stream_name)
+                else:
+                    MESSAGES_FAILED.inc(table=table_name, op=operation)
+                    logger.warning("Failed to sync data from stream %s", stream_name)
+                    # Тот же путь, что у пачек: стоянка, если нет родителя, иначе DeadLetterEvent
+                    await self.applier.apply([(json_msg, message_context.offset)], stream_name)
+                await checkpointer.advance(message_context.offset)
 
             except Exception as e:
-                print(f"Error processing message: {e}, raw message: {msg}")
-                # Offset НЕ сохраняется при ошибке обработки
-        
+                logger.error("Error processing message: %s, raw message: %s", e, msg)
+                # Сообщение откладываем в DeadLetterEvent; пока оно не сохранено, offset держится
+                raw = bytes(msg).decode('utf-8', errors='replace')
+                await self.applier.dead_letter([(None, message_context.offset, stream_name, str(e), raw)])
+                await checkpointer.advance(message_context.offset)
+
         try:
 
             # Запустить потребителя
@@ -102,24 +271,37 @@ class ConsumerPool:
                 callback=on_message,
                 offset_specification=offset_spec
             )
-            print(f"Successfully subscribed to stream: {stream_name}")
+            checkpointer.start()
+            logger.info("Successfully subscribed to stream: %s", stream_name)
             await consumer.run()
         except Exception as e:
-            print(f"Error in consumer {stream_name}: {e}")
+            logger.error("Error in consumer %s: %s", stream_name, e)
+        finally:
+            # Корректная остановка: дописать буфер и сохранить последний закоммиченный offset
+            await finish_bootstrap()
+            if buffer is not None:
+                await buffer.flush()
+            await checkpointer.close()
 
 # Функция для запуска пула потребителей
-def start_consumer_pool():	
+def start_consumer_pool(bootstrap=False):
+    """
+    bootstrap=True включает режим первичной загрузки для стримов без сохранённого offset'а:
+    события снимка вставляются пачками без проверки внешних ключей до конца снимка.
+    """
     streams_config = [
         {"name": "main_stream", "subscriber": "warehouse_main_sub1"},
         {"name": "inventory_stream", "subscriber": "warehouse_inventory_sub2"},
 
         # Добавьте больше конфигураций до MAX_WORKERS
     ]
-    pool = ConsumerPool()
+    pool = ConsumerPool(bootstrap=bootstrap)
     for config in streams_config:
         pool.add_consumer(config)
     
     # Запуск в фоновом потоке
     thread = threading.Thread(target=lambda: asyncio.run(pool.start()), daemon=True)
     thread.start()
+    # Поток демонический, поэтому последний checkpoint сохраняем явно при выходе процесса
+    atexit.register(pool.shutdown)
 
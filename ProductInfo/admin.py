@@ -1,6 +1,7 @@
 from pprint import pprint
 from django.contrib import admin
-from ProductInfo.models import Brand, Store, Category, SubCategory, Product, PriceHistory, ProductImage, Schedule, Unit, ProductVariant, Inventory
+from ProductInfo.models import Brand, Store, Category, SubCategory, Product, PriceHistory, ProductImage, Schedule, Unit, ProductVariant, Inventory, \
+    DeadLetterEvent
 from django.utils.html import format_html
 from import_export.admin import ImportExportModelAdmin
 
@@ -138,6 +139,13 @@ class InventoryAdmin(ImportExportModelAdmin):
     autocomplete_fields = ['variant', 'store']
 
 
+@admin.register(DeadLetterEvent)
+class DeadLetterEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'stream', 'offset', 'table_name', 'op', 'error', 'created_at']
+    list_filter = ['stream', 'table_name', 'op']
+    search_fields = ['error']
+
+
 @admin.register(Product)
 class ProductAdmin(ImportExportModelAdmin):
     resource_class = ProductResource
@@ -6,5 +6,11 @@ class ProductConfig(AppConfig):
 
     def ready(self):
         import ProductInfo.signals
+        from django.conf import settings
         from . import StreamConsumer
-        StreamConsumer.start_consumer_pool()
+        StreamConsumer.start_consumer_pool(bootstrap=getattr(settings, 'CDC_BOOTSTRAP', False))
+
+        from .DebeziumSync.metrics import LogExporter
+        interval = getattr(settings, 'CDC_METRICS_LOG_INTERVAL', None)
+        if interval:
+            LogExporter(interval).start()
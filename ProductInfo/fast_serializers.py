@@ -0,0 +1,157 @@
+"""
+Быстрая отрисовка списков каталога. Сериализатор DRF один раз компилируется в план
+(имя поля, функция получения значения), после чего строка рендерится обычным dict
+без привязки полей и get_attribute/to_representation на каждое поле. JSON на выходе тот же,
+что у исходного сериализатора.
+
+Из того же сериализатора выводится план загрузки: select_related для вложенных объектов
+и StringRelatedField, prefetch_related для вложенных списков — ровно то, что отрисовывается.
+"""
+from functools import lru_cache
+
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .models import Category, Store, SubCategory
+
+# Что читает __str__ модели: StringRelatedField на неё тянет и эти связи
+STR_DEPENDENCIES = {
+    Store: ['brand'],
+    Category: ['store__brand'],
+    SubCategory: ['category__store__brand'],
+}
+
+# Поля, значение которых уже в нужном виде лежит в атрибуте модели
+PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+def _follow(instance, attrs):
+    for attr in attrs:
+        if instance is None:
+            return None
+        instance = getattr(instance, attr)
+    return instance
+
+
+def _related_model(model, attrs):
+    for attr in attrs:
+        model = model._meta.get_field(attr).related_model
+    return model
+
+
+def _compile(serializer):
+    plan = []
+    for name, field in serializer.fields.items():
+        if not field.write_only:
+            plan.append((name, _compile_field(field)))
+
+    def render(instance):
+        return {name: getter(instance) for name, getter in plan}
+
+    return render
+
+
+def _has_custom_representation(serializer):
+    return type(serializer).to_representation is not serializers.Serializer.to_representation
+
+
+def _compile_field(field):
+    attrs = field.source_attrs
+
+    if isinstance(field, serializers.ListSerializer) and not _has_custom_representation(field.child):
+        render_child = _compile(field.child)
+        return lambda instance: [render_child(item) for item in _follow(instance, attrs).all()]
+
+    if isinstance(field, serializers.Serializer) and not _has_custom_representation(field):
+        render_nested = _compile(field)
+
+        def nested(instance):
+            value = _follow(instance, attrs)
+            return None if value is None else render_nested(value)
+        return nested
+
+    if isinstance(field, serializers.StringRelatedField):
+        def string(instance):
+            value = _follow(instance, attrs)
+            return None if value is None else str(value)
+        return string
+
+    # Decimal без приведения к строке отдаём как есть (COERCE_DECIMAL_TO_STRING=False).
+    # coerce_to_string есть у поля, только если передан явно: иначе DRF берёт настройку
+    plain_decimal = isinstance(field, serializers.DecimalField) and not getattr(
+        field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if type(field) in PLAIN_FIELDS or plain_decimal or isinstance(field, serializers.ReadOnlyField):
+        if len(attrs) == 1:
+            attr = attrs[0]
+            return lambda instance: getattr(instance, attr)
+        return lambda instance: _follow(instance, attrs)
+
+    # Остальные поля (даты, сериализаторы со своим to_representation и т.п.) — через сам DRF,
+    # с той же обработкой None
+    def generic(instance):
+        value = field.get_attribute(instance)
+        return None if value is None else field.to_representation(value)
+    return generic
+
+
+def _load_plan(serializer, model, prefix='', inside_many=False):
+    """(select_related, prefetch_related) для всего, что отрисует serializer."""
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        attrs = field.source_attrs
+        path = prefix + '__'.join(attrs)
+
+        if isinstance(field, serializers.ListSerializer):
+            prefetch.append(path)
+            child_select, child_prefetch = _load_plan(
+                field.child, _related_model(model, attrs), path + '__', inside_many=True)
+            prefetch.extend(child_select + child_prefetch)
+        elif isinstance(field, (serializers.BaseSerializer, serializers.StringRelatedField)):
+            related_model = _related_model(model, attrs)
+            paths = [path] + [f"{path}__{dependency}" for dependency in STR_DEPENDENCIES.get(related_model, [])
+                              if isinstance(field, serializers.StringRelatedField)]
+            (prefetch if inside_many else select).extend(paths)
+            if isinstance(field, serializers.BaseSerializer):
+                nested_select, nested_prefetch = _load_plan(field, related_model, path + '__', inside_many)
+                select.extend(nested_select)
+                prefetch.extend(nested_prefetch)
+    return select, prefetch
+
+
+@lru_cache(maxsize=None)
+def get_renderer(serializer_class):
+    return _compile(serializer_class())
+
+
+@lru_cache(maxsize=None)
+def get_load_plan(serializer_class):
+    serializer = serializer_class()
+    select, prefetch = _load_plan(serializer, serializer.Meta.model)
+    return tuple(dict.fromkeys(select)), tuple(dict.fromkeys(prefetch))
+
+
+def with_load_plan(queryset, serializer_class):
+    select, prefetch = get_load_plan(serializer_class)
+    return queryset.select_related(*select).prefetch_related(*prefetch)
+
+
+class FastListMixin:
+    """
+    list() через скомпилированный рендерер, get_queryset() — с планом загрузки serializer_class,
+    поэтому число запросов на страницу постоянно: основной запрос и по одному на каждый prefetch.
+    """
+
+    def get_queryset(self):
+        return with_load_plan(super().get_queryset(), self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        render = get_renderer(self.get_serializer_class())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([render(instance) for instance in page])
+        return Response([render(instance) for instance in queryset])
@@ -0,0 +1,164 @@
+"""
+HTTP-кэш редко меняющихся справочников каталога (бренды, магазины, категории, подкатегории,
+графики, единицы). Каждая модель имеет версию — время последнего изменения в микросекундах —
+в кэше Django. Версию поднимает синхронизация CDC и сигналы моделей после коммита.
+
+ETag ответа строится из URL, формата и версий моделей, которые он отображает, поэтому
+проверка свежести (If-None-Match / If-Modified-Since -> 304) обходится без запроса в БД,
+а данные ответа для текущих версий берутся из того же кэша.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from Shop.metrics import REGISTRY, Counter
+from .models import Brand, Category, Schedule, Store, SubCategory, Unit
+
+# Модели, у которых ведётся версия: изменения остальных таблиц версии не трогают
+TRACKED_MODELS = (Brand, Store, Category, SubCategory, Schedule, Unit)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'LOCAL_TTL': 1,
+    'RESPONSE_TTL': 3600,
+}
+
+HTTP_CACHE_REQUESTS = REGISTRY.register(Counter(
+    'catalog_http_cache_requests_total', "Запросы к справочникам каталога с HTTP-кэшем", ['result']))
+
+
+class CatalogVersions:
+    """
+    Версии моделей в кэше Django (alias). В процессе версии запоминаются на local_ttl секунд,
+    чтобы не ходить в общий кэш на каждый запрос; bump() сбрасывает их сразу.
+    Без общего CACHES версии живут в locmem процесса и видны только ему.
+    """
+
+    def __init__(self, enabled=True, alias='default', local_ttl=1, response_ttl=3600):
+        self.enabled = enabled
+        self.alias = alias
+        self.local_ttl = local_ttl
+        self.response_ttl = response_ttl
+        self._local = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULTS, **getattr(settings, 'CATALOG_HTTP_CACHE', {})}
+        return cls(
+            enabled=config['ENABLED'],
+            alias=config['ALIAS'],
+            local_ttl=config['LOCAL_TTL'],
+            response_ttl=config['RESPONSE_TTL'],
+        )
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _key(model):
+        return f"catalog:version:{model._meta.label_lower}"
+
+    def get(self, models):
+        """{model: версия}. Модели без версии в кэше (после очистки кэша) считаются изменёнными сейчас."""
+        now = time.monotonic()
+        with self._lock:
+            result = {model: entry[0] for model, entry in self._local.items()
+                      if model in models and entry[1] > now}
+
+        missing = [model for model in models if model not in result]
+        if missing:
+            found = self.cache.get_many([self._key(model) for model in missing])
+            for model in missing:
+                version = found.get(self._key(model))
+                if version is None:
+                    version = time.time_ns() // 1000
+                    # add: если другой процесс успел записать версию, берём её
+                    if not self.cache.add(self._key(model), version, timeout=None):
+                        version = self.cache.get(self._key(model), version)
+                result[model] = version
+            with self._lock:
+                for model in missing:
+                    self._local[model] = (result[model], now + self.local_ttl)
+        return result
+
+    def bump(self, *models):
+        """Новая версия для изменённых моделей; вызывать после коммита."""
+        models = [model for model in set(models) if model in TRACKED_MODELS]
+        if not self.enabled or not models:
+            return
+        version = time.time_ns() // 1000
+        self.cache.set_many({self._key(model): version for model in models}, timeout=None)
+        with self._lock:
+            for model in models:
+                self._local.pop(model, None)
+
+    def bump_on_commit(self, *models):
+        transaction.on_commit(lambda: self.bump(*models))
+
+
+CATALOG_VERSIONS = CatalogVersions.from_settings()
+
+
+class VersionedCacheMixin:
+    """
+    list() и retrieve() с ETag/Last-Modified по версиям cache_models и ответом 304 на условный
+    GET. cache_models — все модели, от которых зависит ответ: сама модель, вложенные
+    сериализаторы и поля фильтров.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(request, super().retrieve, *args, **kwargs)
+
+    def _cached(self, request, handler, *args, **kwargs):
+        if not CATALOG_VERSIONS.enabled:
+            return handler(request, *args, **kwargs)
+
+        versions = CATALOG_VERSIONS.get(self.cache_models)
+        stamp = ':'.join(f"{model._meta.label_lower}={versions[model]}" for model in self.cache_models)
+        digest = hashlib.sha1(
+            f"{request.build_absolute_uri()}|{request.accepted_renderer.format}|{stamp}".encode()
+        ).hexdigest()
+        etag = f'"{digest}"'
+        last_modified = max(versions.values()) // 1_000_000
+
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            HTTP_CACHE_REQUESTS.inc(result='not_modified')
+            return self._stamp(not_modified, etag, last_modified)
+
+        key = f"catalog:response:{digest}"
+        data = CATALOG_VERSIONS.cache.get(key)
+        if data is not None:
+            HTTP_CACHE_REQUESTS.inc(result='hit')
+            return self._stamp(Response(data), etag, last_modified)
+
+        HTTP_CACHE_REQUESTS.inc(result='miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        CATALOG_VERSIONS.cache.set(key, response.data, timeout=CATALOG_VERSIONS.response_ttl)
+        return self._stamp(response, etag, last_modified)
+
+    @staticmethod
+    def _stamp(response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Хранить можно, но перед использованием — проверить по ETag
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
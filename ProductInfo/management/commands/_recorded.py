@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import CommandError
+
+
+def load_messages(path):
+    """
+    Читает записанные сообщения Debezium из JSONL: одно сообщение на строку.
+    Поддерживаются и голые конверты, и конверты со схемой ({"schema": ..., "payload": ...}).
+    """
+    messages = []
+    try:
+        with open(path, 'rb') as file:
+            for line_number, line in enumerate(file, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    raise CommandError(f"{path}:{line_number}: invalid JSON: {e}")
+                if 'op' not in message and isinstance(message.get('payload'), dict):
+                    message = message['payload']
+                messages.append(message)
+    except OSError as e:
+        raise CommandError(f"Cannot read {path}: {e}")
+
+    if not messages:
+        raise CommandError(f"No messages in {path}")
+    return messages
+
+
+def load_raw_messages(path):
+    """Сырые строки файла как bytes — так, как их отдаёт стрим в on_message."""
+    try:
+        with open(path, 'rb') as file:
+            messages = [line.rstrip(b'\r\n') for line in file if line.strip()]
+    except OSError as e:
+        raise CommandError(f"Cannot read {path}: {e}")
+
+    if not messages:
+        raise CommandError(f"No messages in {path}")
+    return messages
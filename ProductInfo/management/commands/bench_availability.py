@@ -0,0 +1,99 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from ProductInfo.models import Brand, Category, Inventory, Product, ProductVariant, Store, SubCategory
+from ProductInfo.fast_serializers import with_load_plan
+from ProductInfo.queries import available_variants, available_variants_light
+from ProductInfo.serializers import ProductVariantSerializer
+
+STORE_PREFIX = 'bench-store-'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark доступности вариантов: цикл has_quantity с запросом на вариант против одного EXISTS/JOIN. "
+        "--populate создаёт тестовый каталог (по умолчанию 100k вариантов); запускать на тестовой БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--populate', action='store_true', help="Сначала создать тестовый каталог")
+        parser.add_argument('--variants', type=int, default=100_000, help="Сколько вариантов создать")
+        parser.add_argument('--per-product', type=int, default=5, help="Вариантов на товар")
+        parser.add_argument('--stores', type=int, default=3, help="Сколько складов создать")
+        parser.add_argument('--products-per-request', type=int, default=50, help="Товаров в одном запросе доступности")
+        parser.add_argument('--repeat', type=int, default=20, help="Сколько запросов выполнить")
+
+    def handle(self, *args, **options):
+        if options['populate']:
+            self.populate(options['variants'], options['per_product'], options['stores'])
+
+        product_ids = list(Product.objects.filter(id__startswith='B').values_list('id', flat=True))
+        store_ids = list(Store.objects.filter(id__startswith=STORE_PREFIX).values_list('id', flat=True))
+        if not product_ids or not store_ids:
+            self.stderr.write("Нет тестового каталога: запустите с --populate")
+            return
+
+        queryset = with_load_plan(ProductVariant.objects.all(), ProductVariantSerializer)
+        requests = [
+            (random.sample(product_ids, min(options['products_per_request'], len(product_ids))), random.choice(store_ids))
+            for _ in range(options['repeat'])
+        ]
+
+        def legacy(ids, store_id):
+            found = []
+            for variant in queryset.filter(product__id__in=ids):
+                inventory = Inventory.objects.filter(variant=variant, store_id=store_id).first()
+                if inventory and inventory.quantity > 0:
+                    found.append(variant)
+            return ProductVariantSerializer(found, many=True).data
+
+        def full(ids, store_id):
+            return ProductVariantSerializer(available_variants(queryset, ids, store_id), many=True).data
+
+        for name, func in [('legacy', legacy), ('full', full), ('light', available_variants_light)]:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                rows = sum(len(func(ids, store_id)) for ids, store_id in requests)
+                elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{name:>6}: {elapsed * 1000 / len(requests):.2f} ms/request, "
+                f"{len(queries) / len(requests):.1f} queries/request, {rows} rows"
+            )
+
+    def populate(self, variants, per_product, stores):
+        brand, _ = Brand.objects.get_or_create(title='bench-brand')
+        store_objs = []
+        for index in range(stores):
+            store, _ = Store.objects.get_or_create(
+                id=f"{STORE_PREFIX}{index}",
+                defaults={'brand': brand, 'address': f"Bench {index}", 'city': 'Bench',
+                          'latitude': 0, 'longitude': 0, 'delivery_radius_km': 5},
+            )
+            store_objs.append(store)
+        category, _ = Category.objects.get_or_create(title='bench', store=store_objs[0], defaults={'description': 'bench'})
+        sub_category, _ = SubCategory.objects.get_or_create(title='bench', category=category)
+
+        products = variants // per_product
+        with transaction.atomic():
+            Product.objects.bulk_create([
+                Product(id=f"B{index}", title=f"Bench product {index}", description='', options={},
+                        internal_sku=f"BSKU{index}", group_id='bench', sub_category=sub_category, store=store_objs[0])
+                for index in range(products)
+            ], batch_size=5000, ignore_conflicts=True)
+            ProductVariant.objects.bulk_create([
+                ProductVariant(id=f"BV{index}", product_id=f"B{index // per_product}", price=random.randint(100, 10000),
+                               discount=random.choice([0, 0, 5, 10]), variant_value='', variant_attributes='',
+                               height=1, width=1, depth=1, barcode=f"{index:012d}", weight=100)
+                for index in range(products * per_product)
+            ], batch_size=5000, ignore_conflicts=True)
+            # Примерно половина вариантов есть на каждом складе
+            Inventory.objects.bulk_create([
+                Inventory(variant_id=f"BV{index}", store=store, quantity=random.choice([0, 1, 5, 20]))
+                for store in store_objs
+                for index in range(products * per_product)
+            ], batch_size=5000, ignore_conflicts=True)
+        self.stdout.write(f"populated {products} products, {products * per_product} variants, {stores} stores")
@@ -0,0 +1,48 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from ProductInfo.DebeziumSync.decoding import DECODER_BACKENDS, EnvelopeDecoder
+from ._recorded import load_raw_messages
+
+
+def legacy_decode(msg):
+    # Старый on_message: срез с копией и stdlib json по всему конверту
+    json_start = msg.find(b'{')
+    json_end = msg.rfind(b'}')
+    if json_start == -1 or json_end == -1:
+        return None
+    return json.loads(msg[json_start:json_end + 1])
+
+
+class Command(BaseCommand):
+    help = "Пропускная способность декодирования сообщений стрима: старый путь против EnvelopeDecoder"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Файл с сырыми сообщениями стрима, по одному на строку")
+        parser.add_argument('--repeat', type=int, default=20, help="Сколько раз прогнать весь файл")
+
+    def handle(self, *args, **options):
+        messages = load_raw_messages(options['file'])
+        repeat = options['repeat']
+
+        decoders = [('legacy', legacy_decode)]
+        for backend in DECODER_BACKENDS:
+            decoders.append((backend, EnvelopeDecoder(backend).decode))
+            decoders.append((f"{backend}+schema", EnvelopeDecoder(backend, skip_schema=False).decode))
+
+        total = len(messages) * repeat
+        total_bytes = sum(len(msg) for msg in messages) * repeat
+        baseline = None
+        for name, decode in decoders:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for msg in messages:
+                    decode(msg)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            self.stdout.write(
+                f"{name:>14}: {total / elapsed:,.0f} msg/s, {total_bytes / elapsed / 1_048_576:,.1f} MiB/s, "
+                f"{baseline / elapsed:.2f}x"
+            )
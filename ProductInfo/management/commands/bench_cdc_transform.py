@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ProductInfo.DebeziumSync.debezium_syncing import SyncDataFromDebezium, create_payload
+from ProductInfo.DebeziumSync.mapping import TABLE_MODEL_MAPPING
+from ProductInfo.DebeziumSync.transform import TRANSFORM_PLANS, build_payload
+from ._recorded import load_messages
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark: create_payload + _prepare_data против скомпилированных планов на записанных сообщениях Debezium"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="JSONL с сообщениями Debezium, по одному на строку")
+        parser.add_argument('--repeat', type=int, default=20, help="Сколько раз прогнать весь файл")
+
+    def handle(self, *args, **options):
+        messages = load_messages(options['file'])
+        repeat = options['repeat']
+        handler = SyncDataFromDebezium()
+
+        def legacy(message):
+            payload = create_payload(message)
+            if payload:
+                payload = handler._prepare_data(message.get('source', {}).get('table'), payload)
+            return payload
+
+        # Сначала проверяем, что оба пути дают одинаковый результат. Сравнивается весь payload
+        # старого пути: колонки, которых нет в модели, план отбрасывает намеренно (update_or_create
+        # на них падал) — они считаются отдельно, всё остальное должно совпасть
+        mismatches = 0
+        dropped = 0
+        for message in messages:
+            table_name = message.get('source', {}).get('table')
+            if table_name not in TRANSFORM_PLANS:
+                continue
+            model_fields = {name for field in TABLE_MODEL_MAPPING[table_name]._meta.concrete_fields
+                            for name in (field.name, field.attname)}
+            expected = legacy(message) or {}
+            unknown = expected.keys() - model_fields
+            dropped += len(unknown)
+            expected = {key: value for key, value in expected.items() if key not in unknown}
+            if expected != (build_payload(message) or {}):
+                mismatches += 1
+
+        results = {}
+        for name, func in [('legacy', legacy), ('plan', build_payload)]:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for message in messages:
+                    func(message)
+            results[name] = time.perf_counter() - started
+
+        total = len(messages) * repeat
+        for name, elapsed in results.items():
+            self.stdout.write(f"{name:>6}: {total / elapsed:,.0f} msg/s ({elapsed * 1_000_000 / total:.2f} us/msg)")
+        self.stdout.write(
+            f"speedup: {results['legacy'] / results['plan']:.2f}x, mismatches: {mismatches}, "
+            f"dropped non-model columns: {dropped}"
+        )
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ProductInfo.DebeziumSync.debezium_syncing import SyncDataFromDebezium
+from ProductInfo.DebeziumSync.replay import ReplayConsumer
+from ProductInfo.StreamConsumer import ConsumerPool
+from Shop.benchmarks import percentile
+from ._recorded import load_raw_messages
+
+
+class TimedSyncHandler(SyncDataFromDebezium):
+    """Обработчик, который меряет время и число SQL-запросов каждого применения по таблицам."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.tables = {}
+
+    def apply_data(self, message):
+        table_name = message.get('source', {}).get('table')
+        return self._timed(table_name, 1, super().apply_data, message)
+
+    def apply_batch(self, messages):
+        # ShardedApplier отдаёт в apply_batch события одной таблицы
+        table_name = messages[0].get('source', {}).get('table') if messages else None
+        return self._timed(table_name, len(messages), super().apply_batch, messages)
+
+    def _timed(self, table_name, rows, func, *args):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            result = func(*args)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            stats = self.tables.setdefault(table_name, {'rows': 0, 'latencies': [], 'queries': 0})
+            stats['rows'] += rows
+            stats['latencies'].append(elapsed)
+            stats['queries'] += queries
+        return result
+
+
+class Command(BaseCommand):
+    help = "Прогоняет записанные сообщения Debezium через ConsumerPool и SyncDataFromDebezium без RabbitMQ"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="JSONL с сырыми сообщениями стрима, по одному на строку")
+        parser.add_argument('--stream', default='replay_stream')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--batch-timeout-ms', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--per-message', action='store_true', help="Старый режим: sync_data на каждое сообщение")
+
+    def handle(self, *args, **options):
+        messages = load_raw_messages(options['file'])
+
+        pool = ConsumerPool(
+            batch_size=None if options['per_message'] else options['batch_size'],
+            batch_timeout_ms=options['batch_timeout_ms'],
+            apply_workers=options['workers'],
+        )
+        pool.sync_handler = handler = TimedSyncHandler()
+        consumer = ReplayConsumer(messages)
+        pool.add_consumer({"name": options['stream'], "subscriber": "replay_sub"}, consumer=consumer)
+
+        started = time.perf_counter()
+        asyncio.run(pool.start())
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"replayed {len(messages)} events in {elapsed:.2f}s: {len(messages) / elapsed:,.0f} events/s, "
+            f"store_offset calls: {consumer.store_offset_calls}, last offset: {consumer.stored_offsets}"
+        )
+        self.stdout.write(f"{'table':<18}{'rows':>8}{'calls':>8}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}")
+        for table_name, stats in sorted(handler.tables.items(), key=lambda item: str(item[0])):
+            latencies = stats['latencies']
+            self.stdout.write(
+                f"{str(table_name):<18}{stats['rows']:>8}{len(latencies):>8}"
+                f"{percentile(latencies, 50) * 1000:>10.2f}{percentile(latencies, 99) * 1000:>10.2f}"
+                f"{stats['queries']:>10}"
+            )
+
+        for stream_name, stats in pool.coalescing_stats().items():
+            self.stdout.write(f"coalescing {stream_name}: {stats}")
+        for stream_name, stats in pool.checkpoint_stats().items():
+            self.stdout.write(f"checkpoint {stream_name}: {stats}")
+        self.stdout.write(f"parking: {pool.parking_stats()}")
+        for stats in pool.shard_stats():
+            self.stdout.write(f"shard {stats}")
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ProductInfo', '0002_product_age_restriction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeadLetterEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(max_length=255, verbose_name='Стрим')),
+                ('offset', models.BigIntegerField(blank=True, null=True, verbose_name='Offset')),
+                ('table_name', models.CharField(blank=True, max_length=255, verbose_name='Таблица')),
+                ('op', models.CharField(blank=True, max_length=1, verbose_name='Операция')),
+                ('message', models.JSONField(blank=True, help_text='Разобранное сообщение Debezium, если его удалось декодировать', null=True, verbose_name='Сообщение')),
+                ('raw', models.TextField(blank=True, help_text='Сырое сообщение, если декодировать его не удалось', verbose_name='Исходное сообщение')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Неприменённое событие CDC',
+                'verbose_name_plural': 'Неприменённые события CDC',
+                'indexes': [models.Index(fields=['stream', 'offset'], name='ProductInfo_stream_6f5cbc_idx')],
+            },
+        ),
+    ]
@@ -330,3 +330,25 @@ class PriceHistory(models.Model):
 
 
 
+class DeadLetterEvent(models.Model):
+    """События CDC, которые не удалось применить ни пачкой, ни по одному, ни после ожидания родителя (FK)"""
+    stream = models.CharField(max_length=255, verbose_name="Стрим")
+    offset = models.BigIntegerField(null=True, blank=True, verbose_name="Offset")
+    table_name = models.CharField(max_length=255, blank=True, verbose_name="Таблица")
+    op = models.CharField(max_length=1, blank=True, verbose_name="Операция")
+    message = models.JSONField(null=True, blank=True, verbose_name="Сообщение",
+                               help_text="Разобранное сообщение Debezium, если его удалось декодировать")
+    raw = models.TextField(blank=True, verbose_name="Исходное сообщение",
+                           help_text="Сырое сообщение, если декодировать его не удалось")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = 'Неприменённое событие CDC'
+        verbose_name_plural = 'Неприменённые события CDC'
+        indexes = [
+            models.Index(fields=['stream', 'offset']),
+        ]
+
+    def __str__(self):
+        return f"{self.stream}@{self.offset} {self.table_name} {self.op}"
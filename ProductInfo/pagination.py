@@ -1,4 +1,10 @@
+import base64
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from urllib.parse import urlparse, parse_qs
 
@@ -23,4 +29,104 @@ class CustomPagination(pagination.PageNumberPagination):
             },
             'count': self.page.paginator.num_pages,
             'results': data
-        })
\ No newline at end of file
+        })
+
+
+class KeysetPagination(CustomPagination):
+    """
+    Курсорная (keyset) пагинация для больших каталогов: страница выбирается условием
+    WHERE (ordering) > (значения последней строки) вместо OFFSET, поэтому глубокие страницы
+    не медленнее первых. Включается параметром ?pagination=cursor или переданным ?cursor=...;
+    без них работает обычная постраничная пагинация CustomPagination.
+
+    Порядок берётся из атрибута вьюсета keyset_ordering — поля сортировки модели плюс уникальный
+    хвост (pk), чтобы порядок был строгим. ?count=false отключает COUNT(*) — тогда count равен None.
+    Ответ сохраняет форму CustomPagination: links.next / links.previous — непрозрачные курсоры.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+    cursor_page_size = 50
+    max_cursor_page_size = 500
+
+    cursor_mode = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = list(view.keyset_ordering)
+        page_size = self.get_cursor_page_size(request)
+        direction, values = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        backwards = direction == 'p'
+
+        page_queryset = queryset.order_by(*[f"-{field}" for field in self.ordering] if backwards else self.ordering)
+        if values is not None:
+            page_queryset = page_queryset.filter(self.keyset_filter(values, backwards))
+
+        rows = list(page_queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        # Назад есть куда идти, если пришли по курсору вперёд; вперёд — если пришли назад
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else values is not None
+        self.next_cursor = self.encode_cursor('n', rows[-1]) if rows and has_next else None
+        self.previous_cursor = self.encode_cursor('p', rows[0]) if rows and has_previous else None
+
+        self.total_pages = None
+        if request.query_params.get(self.count_query_param, 'true').lower() not in ('0', 'false', 'no'):
+            self.total_pages = -(-queryset.count() // page_size)
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'links': {
+                'next': self.next_cursor,
+                'previous': self.previous_cursor,
+            },
+            'count': self.total_pages,
+            'results': data
+        })
+
+    def get_cursor_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get('page_size', self.cursor_page_size))
+        except ValueError:
+            page_size = self.cursor_page_size
+        return max(1, min(page_size, self.max_cursor_page_size))
+
+    def keyset_filter(self, values, backwards):
+        """(a, b, c) > (x, y, z) как a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)."""
+        lookup = 'lt' if backwards else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            equal = {name: value for name, value in zip(self.ordering[:index], values[:index])}
+            condition |= Q(**equal, **{f"{field}__{lookup}": values[index]})
+        return condition
+
+    def encode_cursor(self, direction, instance):
+        values = [getattr(instance, field) for field in self.ordering]
+        payload = json.dumps({'d': direction, 'v': values}, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return 'n', None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            direction, values = payload['d'], payload['v']
+        except (ValueError, KeyError, TypeError):
+            raise NotFound("Invalid cursor")
+        if direction not in ('n', 'p') or not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        return direction, values
@@ -0,0 +1,62 @@
+from django.db.models import Exists, F, OuterRef
+
+from .models import Inventory
+
+
+def in_stock(store_id):
+    """Остаток варианта (OuterRef('pk')) на складе store_id, если он больше нуля."""
+    return Inventory.objects.filter(variant=OuterRef('pk'), store_id=store_id, quantity__gt=0)
+
+
+def available_variants(queryset, product_ids, store_id):
+    """Варианты товаров product_ids, которые есть на складе store_id: один запрос с EXISTS."""
+    return queryset.filter(product__id__in=product_ids).filter(Exists(in_stock(store_id)))
+
+
+def available_variants_light(product_ids, store_id):
+    """
+    Лёгкая форма доступности: строки Inventory склада, соединённые с вариантом, без создания моделей.
+    Одна выборка по уникальному ключу (variant, store).
+    """
+    return list(
+        Inventory.objects
+        .filter(store_id=store_id, quantity__gt=0, variant__product_id__in=product_ids)
+        .order_by('variant__product_id', 'variant__barcode')
+        .values(
+            'variant_id',
+            'quantity',
+            product_id=F('variant__product_id'),
+            price=F('variant__price'),
+            discount=F('variant__discount'),
+            variant_value=F('variant__variant_value'),
+            barcode=F('variant__barcode'),
+        )
+    )
+
+
+PRICE_COLUMNS = ('product_id', 'variant_id', 'price', 'discount', 'quantity')
+
+# Сколько id отправлять в одном IN: тысячи id режем на несколько запросов
+PRICE_CHUNK_SIZE = 2000
+
+
+def store_prices_columnar(store_id, product_ids):
+    """
+    Цена, скидка и остаток вариантов товаров product_ids на складе store_id в колоночном виде:
+    {'product_id': [...], 'variant_id': [...], 'price': [...], ...} — параллельные массивы.
+    Варианты без строки Inventory на этом складе в магазине не продаются и не попадают в ответ.
+    Модели не создаются: values_list по Inventory с JOIN'ом варианта.
+    """
+    columns = {name: [] for name in PRICE_COLUMNS}
+    product_ids = list(dict.fromkeys(product_ids))
+    for start in range(0, len(product_ids), PRICE_CHUNK_SIZE):
+        rows = (
+            Inventory.objects
+            .filter(store_id=store_id, variant__product_id__in=product_ids[start:start + PRICE_CHUNK_SIZE])
+            .order_by()
+            .values_list('variant__product_id', 'variant_id', 'variant__price', 'variant__discount', 'quantity')
+        )
+        for row in rows:
+            for name, value in zip(PRICE_COLUMNS, row):
+                columns[name].append(value)
+    return columns
@@ -7,7 +7,7 @@ from .models import Product, Brand, Store, Category, SubCategory, PriceHistory,
 class BrandSerializer(serializers.ModelSerializer):
     class Meta:
         model = Brand
-        fields = ['id', 'title', 'image', 'is_only_warehouse', 'store']
+        fields = ['id', 'title', 'image', 'is_only_warehouse']
 
 
 class SubCategorySerializer(serializers.ModelSerializer):
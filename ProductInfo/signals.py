@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .http_cache import CATALOG_VERSIONS, TRACKED_MODELS
+
+
+@receiver([post_save, post_delete])
+def bump_catalog_version(sender, **kwargs):
+    # Одиночные записи: CDC (apply_data), API и админка; bulk-запись CDC поднимает версии сама
+    if sender in TRACKED_MODELS:
+        CATALOG_VERSIONS.bump_on_commit(sender)
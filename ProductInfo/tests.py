@@ -1,3 +1,528 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from rest_framework.renderers import JSONRenderer
+
+from .DebeziumSync.bootstrap import SnapshotLoader
+from .DebeziumSync.checkpoint import Checkpointer
+from .DebeziumSync.coalescing import Coalescer
+from .DebeziumSync.debezium_syncing import SyncDataFromDebezium
+from .DebeziumSync.sharding import TABLE_LEVELS, ApplyShard, ShardedApplier
+from .DebeziumSync.transform import build_payload
+from .http_cache import CATALOG_VERSIONS
+from .models import Brand, Category, Inventory, Product, ProductVariant, Store, SubCategory, Unit
+from .serializers import InventorySerializer
+
+
+def cdc_event(table, op, row):
+    return {'op': op, 'source': {'table': table}, 'before' if op == 'd' else 'after': row}
+
+
+def base64_cents(value):
+    """DECIMAL в формате Debezium: base64 big-endian числа в копейках."""
+    cents = round(value * 100)
+    return base64.b64encode(cents.to_bytes(4, byteorder='big')).decode()
+
+
+def store_row(store_id, brand_id, **extra):
+    return {
+        'id': store_id, 'brand_id': brand_id, 'address': 'Main st. 1', 'city': 'Tashkent',
+        'latitude': base64_cents(41.3), 'longitude': base64_cents(69.24), 'delivery_radius_km': base64_cents(5),
+        'is_active': True, 'is_only_warehouse': False, **extra,
+    }
+
+
+class CoalescerTests(SimpleTestCase):
+    def test_create_then_delete_collapses_to_delete(self):
+        # При повторной доставке create мог быть уже применён: delete должен дойти до БД
+        coalescer = Coalescer()
+        coalescer.add('Units', cdc_event('Units', 'c', {'id': 1, 'title': 'kg'}), 1)
+        coalescer.add('Units', cdc_event('Units', 'd', {'id': 1}), 2)
+
+        batch, last_offset = coalescer.drain()
+
+        self.assertEqual([message['op'] for message, _ in batch], ['d'])
+        self.assertEqual(last_offset, 2)
+        self.assertEqual(coalescer.stats()['saved'], 1)
+
+
+class TableLevelsTests(SimpleTestCase):
+    def test_parents_come_before_children_and_independent_tables_share_a_level(self):
+        level = {table: index for index, tables in enumerate(TABLE_LEVELS) for table in tables}
+
+        self.assertLess(level['Brands'], level['Stores'])
+        self.assertLess(level['Stores'], level['Categories'])
+        self.assertLess(level['Product_variants'], level['Inventory'])
+        self.assertEqual(level['Brands'], level['Units'])
+        self.assertEqual(level['Product_images'], level['Product_variants'])
+
+
+class TransformPlanTests(SimpleTestCase):
+    def test_unmapped_model_columns_pass_through(self):
+        # В FIELD_MAPPING у Stores ключ 'brand', а сообщение несёт колонку brand_id
+        payload = build_payload(cdc_event('Stores', 'c', store_row('s1', 7, unknown_column='x')))
+
+        self.assertEqual(payload['brand_id'], 7)
+        self.assertEqual(payload['latitude'], 41.3)
+        self.assertNotIn('unknown_column', payload)
+
+
+class ApplyStoreWithBrandIdTests(TestCase):
+    def setUp(self):
+        self.brand = Brand.objects.create(title='Brand')
+        self.handler = SyncDataFromDebezium()
+
+    def test_apply_data_keeps_brand_id(self):
+        self.assertTrue(self.handler.apply_data(cdc_event('Stores', 'c', store_row('s1', self.brand.id))))
+        self.assertEqual(Store.objects.get(id='s1').brand_id, self.brand.id)
+
+    def test_apply_batch_keeps_brand_id(self):
+        self.assertTrue(self.handler.apply_batch([cdc_event('Stores', 'r', store_row('s2', self.brand.id))]))
+        self.assertEqual(Store.objects.get(id='s2').brand_id, self.brand.id)
+
+
+class FakeSyncHandler:
+    """Обработчик без БД: broken — id, которые не применяются; missing — id без родителя."""
+
+    def __init__(self, broken=(), missing=(), dead_letter_ok=True):
+        self.broken = set(broken)
+        self.missing = set(missing)
+        self.dead_letter_ok = dead_letter_ok
+        self.dead_letters = []
+
+    def _ok(self, message):
+        row_id = (message.get('after') or message.get('before'))['id']
+        return row_id not in self.broken and row_id not in self.missing
+
+    def apply_batch(self, messages):
+        return all(self._ok(message) for message in messages)
+
+    def apply_data(self, message):
+        return self._ok(message)
+
+    def missing_parents(self, message):
+        row_id = message['after']['id']
+        return [('ProductInfo.ProductVariant', 'v1')] if row_id in self.missing else []
+
+    def record_dead_letter(self, stream_name, message, offset, error, raw=''):
+        if self.dead_letter_ok:
+            self.dead_letters.append(offset)
+        return self.dead_letter_ok
+
+
+class CheckpointHoldTests(SimpleTestCase):
+    async def run_with(self, handler, **options):
+        applier = ShardedApplier(handler, workers=2, **options)
+        applier.start()
+        stored = []
+
+        async def store(offset):
+            stored.append(offset)
+
+        checkpointer = Checkpointer(store, every_messages=1, interval=60, hold=lambda: applier.min_offset('s'))
+        return applier, checkpointer, stored
+
+    async def test_failed_event_is_dead_lettered_and_does_not_pin_checkpoint(self):
+        handler = FakeSyncHandler(broken={'i1'})
+        applier, checkpointer, stored = await self.run_with(handler)
+        try:
+            batch = [(cdc_event('Inventory', 'u', {'id': 'i1'}), 10), (cdc_event('Inventory', 'u', {'id': 'i2'}), 11)]
+            self.assertTrue(await applier.apply(batch, 's'))
+            await checkpointer.advance(11, 2)
+        finally:
+            applier.close()
+
+        self.assertEqual(handler.dead_letters, [10])
+        self.assertEqual(stored, [11])
+
+    async def test_unsaved_dead_letter_holds_checkpoint_until_retry_succeeds(self):
+        handler = FakeSyncHandler(broken={'i1'}, dead_letter_ok=False)
+        applier, checkpointer, stored = await self.run_with(handler)
+        try:
+            self.assertFalse(await applier.apply([(cdc_event('Inventory', 'u', {'id': 'i1'}), 10)], 's'))
+            await checkpointer.advance(10)
+            # Всё до удержанного offset'а сохранить можно
+            self.assertEqual(stored, [9])
+
+            handler.dead_letter_ok = True
+            await applier.maintain()
+            await checkpointer.store()
+        finally:
+            applier.close()
+
+        self.assertEqual(stored, [9, 10])
+
+    async def test_parked_event_expires_on_timer_without_new_batches(self):
+        handler = FakeSyncHandler(missing={'i1'})
+        applier, checkpointer, stored = await self.run_with(handler, parking_ttl=0, maintenance_interval=0.01)
+        try:
+            self.assertTrue(await applier.apply([(cdc_event('Inventory', 'u', {'id': 'i1'}), 10)], 's'))
+            await checkpointer.advance(10)
+            for _ in range(100):
+                if handler.dead_letters:
+                    break
+                await asyncio.sleep(0.01)
+            await checkpointer.store()
+        finally:
+            applier.close()
+
+        self.assertEqual(handler.dead_letters, [10])
+        self.assertEqual(stored, [9, 10])
+
+
+class ParkingCheckpointTests(SimpleTestCase):
+    async def test_checkpoint_moves_forward_after_parked_event_expires(self):
+        handler = FakeSyncHandler(missing={'i1'})
+        # Обслуживание по таймеру не вмешивается: время двигаем вручную
+        applier = ShardedApplier(handler, workers=2, parking_ttl=60, maintenance_interval=3600)
+        applier.start()
+        stored = []
+
+        async def store(offset):
+            stored.append(offset)
+
+        checkpointer = Checkpointer(store, every_messages=1, interval=3600, hold=lambda: applier.min_offset('s'))
+        try:
+            batch = [(cdc_event('Inventory', 'u', {'id': 'i1'}), 10), (cdc_event('Inventory', 'u', {'id': 'i2'}), 11)]
+            self.assertTrue(await applier.apply(batch, 's'))
+            await checkpointer.advance(11, 2)
+            self.assertEqual(stored, [9])
+            self.assertEqual(len(applier.parking), 1)
+
+            # До истечения ttl событие остаётся на стоянке и держит checkpoint
+            await applier.maintain()
+            await checkpointer.store()
+            self.assertEqual(stored, [9])
+
+            later = time.monotonic() + 61
+            with mock.patch('ProductInfo.DebeziumSync.parking.time.monotonic', return_value=later):
+                await applier.maintain()
+            await checkpointer.store()
+        finally:
+            applier.close()
+
+        self.assertEqual(len(applier.parking), 0)
+        self.assertEqual(handler.dead_letters, [10])
+        self.assertEqual(stored, [9, 11])
+
+
+class RowStoreHandler(FakeSyncHandler):
+    """
+    Обработчик с «таблицей» Inventory в памяти: строка применяется, только если её
+    вариант (variant_id) уже пришёл событием Product_variants.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.variants = set()
+        self.rows = {}
+
+    def _missing(self, message):
+        if message['source']['table'] != 'Inventory' or message['op'] == 'd':
+            return []
+        variant_id = message['after']['variant_id']
+        return [] if variant_id in self.variants else [('ProductInfo.ProductVariant', variant_id)]
+
+    def _apply(self, message):
+        row = message.get('after') or message.get('before')
+        if message['source']['table'] == 'Product_variants':
+            self.variants.add(row['id'])
+        elif message['op'] == 'd':
+            self.rows.pop(row['id'], None)
+        else:
+            self.rows[row['id']] = row['quantity']
+
+    def apply_batch(self, messages):
+        if any(self._missing(message) for message in messages):
+            return False
+        for message in messages:
+            self._apply(message)
+        return True
+
+    def apply_data(self, message):
+        return self.apply_batch([message])
+
+    def missing_parents(self, message):
+        return self._missing(message)
+
+
+def inventory_event(op, quantity=None):
+    return cdc_event('Inventory', op, {'id': 'i9', 'variant_id': 'v1', 'quantity': quantity})
+
+
+class ParkingOrderTests(SimpleTestCase):
+    async def apply_in_turn(self, handler, *events, **options):
+        applier = ShardedApplier(handler, workers=2, maintenance_interval=3600, **options)
+        applier.start()
+        try:
+            for offset, event in enumerate(events, start=1):
+                self.assertTrue(await applier.apply([(event, offset)], 's'))
+        finally:
+            applier.close()
+        return applier
+
+    async def test_update_after_parked_create_wins(self):
+        handler = RowStoreHandler()
+        await self.apply_in_turn(handler, inventory_event('c', 5), inventory_event('u', 1),
+                                 cdc_event('Product_variants', 'c', {'id': 'v1'}))
+        self.assertEqual(handler.rows, {'i9': 1})
+
+    async def test_delete_after_parked_create_is_not_undone(self):
+        handler = RowStoreHandler()
+        applier = await self.apply_in_turn(handler, inventory_event('c', 5), inventory_event('d'),
+                                           cdc_event('Product_variants', 'c', {'id': 'v1'}))
+        self.assertEqual(handler.rows, {})
+        self.assertEqual(len(applier.parking), 0)
+
+    async def test_newer_events_wait_behind_parked_one(self):
+        handler = RowStoreHandler()
+        applier = await self.apply_in_turn(handler, inventory_event('c', 5), inventory_event('u', 1))
+        self.assertEqual(handler.rows, {})
+        self.assertEqual(applier.min_offset('s'), 1)
+        self.assertEqual(applier.parking.release([('ProductInfo.ProductVariant', 'v1')]),
+                         [(inventory_event('c', 5), 1, 's'), (inventory_event('u', 1), 2, 's')])
+
+    async def test_evicted_event_is_dead_lettered_before_checkpoint_moves(self):
+        handler = FakeSyncHandler(missing={'i1', 'i2'})
+        applier = ShardedApplier(handler, workers=2, parking_max_size=1, maintenance_interval=3600)
+        applier.start()
+        holds = []
+        record = handler.record_dead_letter
+
+        def record_and_check_hold(*args):
+            # Пока событие пишется в DeadLetterEvent, checkpoint на нём держится
+            holds.append(applier.min_offset('s'))
+            return record(*args)
+
+        handler.record_dead_letter = record_and_check_hold
+        try:
+            self.assertTrue(await applier.apply([(cdc_event('Inventory', 'u', {'id': 'i1'}), 1)], 's'))
+            self.assertTrue(await applier.apply([(cdc_event('Inventory', 'u', {'id': 'i2'}), 2)], 's'))
+        finally:
+            applier.close()
+
+        self.assertEqual(handler.dead_letters, [1])
+        self.assertEqual(holds, [1])
+        self.assertEqual(applier.parking.evicted, 1)
+        self.assertEqual(applier.min_offset('s'), 2)
+
+
+class CatalogFixtureMixin:
+    def make_catalog(self):
+        self.brand = Brand.objects.create(title='Brand')
+        self.store = Store.objects.create(id='s1', brand=self.brand, address='Main st. 1', city='Tashkent',
+                                          latitude=Decimal('41.3'), longitude=Decimal('69.24'),
+                                          delivery_radius_km=Decimal('5'))
+        category = Category.objects.create(title='Drinks', description='', store=self.store)
+        self.sub_category = SubCategory.objects.create(title='Water', category=category)
+        self.unit = Unit.objects.create(title='Piece', short_name='pc')
+
+    def make_product(self, product_id, title):
+        return Product.objects.create(id=product_id, title=title, description='', options={}, internal_sku=product_id,
+                                      group_id='g', sub_category=self.sub_category, store=self.store, unit=self.unit)
+
+    def make_variant(self, variant_id, product, barcode, quantity=1):
+        variant = ProductVariant.objects.create(
+            id=variant_id, product=product, price=Decimal('10.00'), variant_value='1', variant_attributes='',
+            height=Decimal('1'), width=Decimal('1'), depth=Decimal('1'), barcode=barcode, weight=100)
+        Inventory.objects.create(variant=variant, store=self.store, quantity=quantity)
+        return variant
+
+
+class ShardQueueDepthMetricTests(SimpleTestCase):
+    async def test_queue_depth_is_exported_per_shard(self):
+        shard = ApplyShard(97)
+        shard.start()
+        running, release = threading.Event(), threading.Event()
+
+        def blocking_job(messages):
+            running.set()
+            release.wait(5)
+            return True
+
+        try:
+            jobs = [asyncio.create_task(shard.submit(blocking_job, [1]))]
+            await asyncio.to_thread(running.wait, 5)
+            # Первое задание в работе, два следующих ждут в очереди
+            jobs += [asyncio.create_task(shard.submit(lambda messages: True, [n])) for n in (2, 3)]
+            await asyncio.sleep(0)
+
+            response = await self.async_client.get('/product/metrics/')
+            self.assertIn('cdc_shard_queue_depth{shard="97"} 2', response.content.decode())
+
+            release.set()
+            await asyncio.gather(*jobs)
+            response = await self.async_client.get('/product/metrics/')
+            self.assertIn('cdc_shard_queue_depth{shard="97"} 0', response.content.decode())
+        finally:
+            release.set()
+            shard.close()
+
+
+class KeysetPaginationTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.make_catalog()
+        # Одинаковые названия: порядок внутри них задаёт хвост keyset_ordering (id)
+        titles = {'p7': 'A', 'p3': 'B', 'p1': 'B', 'p5': 'B', 'p2': 'C', 'p6': 'C', 'p4': 'D'}
+        for product_id, title in titles.items():
+            self.make_product(product_id, title)
+        self.expected = ['p7', 'p1', 'p3', 'p5', 'p2', 'p6', 'p4']
+
+    def get_page(self, **params):
+        response = self.client.get('/product/product/', {'page_size': 3, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, direction, page):
+        pages = [page]
+        while page['links'][direction]:
+            page = self.get_page(cursor=page['links'][direction])
+            pages.append(page)
+        return pages
+
+    @staticmethod
+    def ids(pages):
+        return [[row['id'] for row in page['results']] for page in pages]
+
+    def test_next_cursors_visit_every_row_once_across_ties(self):
+        pages = self.walk('next', self.get_page(pagination='cursor'))
+        self.assertEqual(self.ids(pages), [['p7', 'p1', 'p3'], ['p5', 'p2', 'p6'], ['p4']])
+        self.assertEqual({page['count'] for page in pages}, {3})
+        self.assertIsNone(pages[0]['links']['previous'])
+
+    def test_previous_cursors_return_the_same_pages(self):
+        forward = self.walk('next', self.get_page(pagination='cursor'))
+        backward = self.walk('previous', forward[-1])
+        self.assertEqual(self.ids(backward), self.ids(forward)[::-1])
+        self.assertIsNone(backward[-1]['links']['previous'])
+        self.assertIsNotNone(backward[-1]['links']['next'])
+
+    def test_count_can_be_skipped(self):
+        self.assertIsNone(self.get_page(pagination='cursor', count='false')['count'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/product/product/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_inventory_pages_by_store_and_variant(self):
+        product = Product.objects.get(id='p1')
+        variants = [self.make_variant(f"v{index}", product, barcode='same') for index in range(5)]
+        response = self.client.get('/product/inventory/', {'pagination': 'cursor', 'page_size': 2})
+        seen = []
+        while True:
+            data = response.json()
+            seen += [row['variant']['id'] for row in data['results']]
+            if not data['links']['next']:
+                break
+            response = self.client.get('/product/inventory/', {'cursor': data['links']['next'], 'page_size': 2})
+        self.assertEqual(seen, [variant.id for variant in variants])
+
+
+class FastListQueryTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.make_catalog()
+
+    def add_products(self, count):
+        for index in range(count):
+            product = self.make_product(f"p{Product.objects.count()}", 'Water')
+            self.make_variant(f"v{ProductVariant.objects.count()}", product, barcode=str(index))
+
+    def assertListQueries(self, url, queries):
+        for count in (1, 10):
+            self.add_products(count)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_product_list(self):
+        self.assertListQueries('/product/product/', 2)
+
+    def test_variant_list(self):
+        self.assertListQueries('/product/product-variant/', 2)
+
+    def test_inventory_list(self):
+        self.assertListQueries('/product/inventory/', 2)
+
+    def test_output_matches_drf_serializer(self):
+        self.add_products(3)
+        response = self.client.get('/product/inventory/')
+        expected = JSONRenderer().render(InventorySerializer(Inventory.objects.all(), many=True).data)
+        self.assertEqual(response.json(), json.loads(expected))
+
+
+class AvailabilityQueryTests(CatalogFixtureMixin, TestCase):
+    def setUp(self):
+        self.make_catalog()
+        for index in range(50):
+            product = self.make_product(f"p{index}", 'Water')
+            self.make_variant(f"v{index}", product, barcode=str(index), quantity=1 - index % 2)
+
+    def assertAvailabilityQueries(self, shape, queries):
+        for size in (1, 50):
+            product_ids = [f"p{index}" for index in range(size)]
+            with self.assertNumQueries(queries):
+                response = self.client.post('/product/product-variant/availability/',
+                                            {'product_ids': product_ids, 'store_id': self.store.id, 'shape': shape},
+                                            content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            # В наличии только варианты с чётным номером
+            self.assertEqual(len(response.json()), (size + 1) // 2)
+
+    def test_light_shape(self):
+        self.assertAvailabilityQueries('light', 1)
+
+    def test_full_shape(self):
+        self.assertAvailabilityQueries('full', 2)
+
+
+class CatalogHttpCacheTests(TestCase):
+    url = '/product/unit/'
+
+    def setUp(self):
+        caches[CATALOG_VERSIONS.alias].clear()
+        CATALOG_VERSIONS._local.clear()
+        self.addCleanup(CATALOG_VERSIONS._local.clear)
+        Unit.objects.create(title='Piece', short_name='pc')
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_conditional_get_is_answered_without_queries(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_model_save_changes_etag(self):
+        etag = self.get()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Unit.objects.create(title='Kilogram', short_name='kg')
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(sorted(row['short_name'] for row in response.json()), ['kg', 'pc'])
+
+    def test_snapshot_load_changes_etag(self):
+        etag = self.get()['ETag']
+        loader = SnapshotLoader()
+        self.addCleanup(loader.close)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(loader._load([cdc_event('Units', 'r', {'id': 99, 'title': 'Litre', 'short_name': 'l'})]))
+        connection.enable_constraint_checking()
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('l', [row['short_name'] for row in response.json()])
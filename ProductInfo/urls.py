@@ -18,4 +18,6 @@ router.register('inventory', views.InventoryViewSet)
 router.register('schedule', views.ScheduleViewSet)
 router.register('unit', views.UnitViewSet)
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = router.urls + [
+    path('metrics/', views.cdc_metrics, name='cdc-metrics'),
+]
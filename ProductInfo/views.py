@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
-from django.db.models import F
+from django.db.models import Exists, F, OuterRef
+from django.http import HttpResponse
 from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
@@ -9,45 +10,57 @@ from rest_framework.viewsets import ModelViewSet
 from ProductInfo.models import Product, Brand, Store, Category, SubCategory, ProductVariant, Inventory, Schedule, Unit
 from .serializers import ProductSerializer, BrandSerializer, StoreSerializer, CategorySerializer, SubCategorySerializer, \
     ProductVariantSerializer, InventorySerializer, ScheduleSerializer, UnitSerializer
-from .pagination import CustomPagination
+from .fast_serializers import FastListMixin, with_load_plan
+from .http_cache import VersionedCacheMixin
+from .pagination import KeysetPagination
+from .queries import available_variants, available_variants_light, store_prices_columnar
+from Shop.metrics import REGISTRY
 
 
-class BrandViewSet(ModelViewSet):
+class BrandViewSet(VersionedCacheMixin, ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['store__id']
+    cache_models = (Brand, Store)
 
 
-class BrandViewSetOverride(ModelViewSet):
+class BrandViewSetOverride(VersionedCacheMixin, ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['store__id']
     pagination_class = None
+    cache_models = (Brand, Store)
 
 
-class StoreViewSet(ModelViewSet):
-    queryset = Store.objects.all()
+class StoreViewSet(VersionedCacheMixin, ModelViewSet):
+    queryset = Store.objects.select_related('brand').all()
     serializer_class = StoreSerializer
     pagination_class = None  # Disable pagination
+    cache_models = (Store, Brand)
 
 
-class CategoryViewSet(ModelViewSet):
-    queryset = Category.objects.select_related('store').all()
+class CategoryViewSet(VersionedCacheMixin, ModelViewSet):
+    queryset = Category.objects.select_related('store__brand').all()
     serializer_class = CategorySerializer
+    cache_models = (Category, Store, Brand)
 
 
-class SubCategoryViewSet(ModelViewSet):
+class SubCategoryViewSet(VersionedCacheMixin, ModelViewSet):
     queryset = SubCategory.objects.all()
     serializer_class = SubCategorySerializer
+    cache_models = (SubCategory,)
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.select_related('sub_category', 'store').prefetch_related('product_images')
+class ProductViewSet(FastListMixin, ModelViewSet):
+    # select_related/prefetch_related по сериализатору добавляет FastListMixin
+    queryset = Product.objects.all()
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['sub_category', 'store']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('title', 'id')  # Meta.ordering + pk для строгого порядка
 
 
 class ProductVariantFilter(filters.FilterSet):
@@ -58,15 +71,12 @@ class ProductVariantFilter(filters.FilterSet):
         fields = ['product__id']
 
 
-class ProductVariantViewSet(ModelViewSet):
-    queryset = ProductVariant.objects.select_related(
-        'product__store__brand',  # Загружаем Product, Store и связанный Brand
-        'product__sub_category',
-    ).prefetch_related(
-        'product__product_images'
-    ).all()
+class ProductVariantViewSet(FastListMixin, ModelViewSet):
+    # select_related/prefetch_related по сериализатору добавляет FastListMixin
+    queryset = ProductVariant.objects.all()
 
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
+    keyset_ordering = ('product_id', 'barcode', 'id')  # Meta.ordering + pk для строгого порядка
     serializer_class = ProductVariantSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ProductVariantFilter
@@ -84,19 +94,43 @@ class ProductVariantViewSet(ModelViewSet):
         except ValueError:
             return Response({'error': 'Invalid product id provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Ищем варианты продукта и связанные остатки
-        filtered_products = self.queryset.filter(product__id=product_id)
-        
-        # Фильтруем по складу через Inventory
-        inventory_products = []
-        for variant in filtered_products:
-            inventory = Inventory.objects.filter(variant=variant, store_id=store_id).first()
-            if inventory and inventory.quantity > 0:
-                inventory_products.append(variant)
+        # Варианты продукта, которые есть на складе, — одним запросом с EXISTS по Inventory
+        inventory_products = available_variants(self.get_queryset(), [product_id], store_id)
 
         serializer = ProductVariantSerializer(inventory_products, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(methods=['get', 'post'], detail=False)
+    def availability(self, request, *args, **kwargs):
+        """
+        Доступные на складе варианты многих товаров за фиксированное число запросов.
+        GET ?product_ids=1,2,3&store_id=...&shape=light или POST с теми же полями в теле
+        (product_ids — список). shape=light (по умолчанию) — плоские строки без вложенных
+        объектов, shape=full — ProductVariantSerializer.
+        """
+        params = request.data if request.method == 'POST' else request.GET
+        product_ids = params.get('product_ids')
+        store_id = params.get('store_id')
+        shape = params.get('shape', 'light')
+
+        if not product_ids or not store_id:
+            return Response({'error': 'No product_ids or store_id provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(product_ids, str):
+            product_ids = [product_id for product_id in product_ids.split(',') if product_id]
+        if not isinstance(product_ids, list):
+            return Response({'error': 'product_ids must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        product_ids = [str(product_id) for product_id in product_ids]
+
+        if shape == 'light':
+            return Response(available_variants_light(product_ids, store_id), status=status.HTTP_200_OK)
+        if shape != 'full':
+            return Response({'error': 'shape must be light or full'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Запрос вариантов с планом загрузки сериализатора — число запросов не зависит от размера
+        variants = available_variants(self.get_queryset(), product_ids, store_id)
+        serializer = ProductVariantSerializer(variants, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
 class GetPriceViewSet(ModelViewSet):
     queryset = ProductVariant.objects.all()
@@ -104,8 +138,25 @@ class GetPriceViewSet(ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['product__id']
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get', 'post'])
     def bulk(self, request, pk=None):
+        """
+        GET ?product_ids=1,2,3&store_id=... — варианты товаров, которые продаются на складе
+        (прежний формат ProductVariantSerializer).
+        POST {"store_id": ..., "product_ids": [...]} — тысячи id за раз: цена, скидка и остаток
+        в колоночном виде (параллельные массивы), без создания моделей.
+        """
+        if request.method == 'POST':
+            product_ids = request.data.get('product_ids')
+            store_id = request.data.get('store_id')
+            if not product_ids or not store_id or not isinstance(product_ids, list):
+                return Response({'error': 'store_id and a list of product_ids are required'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            product_ids = [str(product_id) for product_id in product_ids]
+            columns = store_prices_columnar(store_id, product_ids)
+            return Response({'store_id': store_id, 'count': len(columns['variant_id']), **columns},
+                            status=status.HTTP_200_OK)
+
         product_ids = request.GET.getlist('product_ids')
         store_id = request.GET.get('store_id')
 
@@ -117,27 +168,42 @@ class GetPriceViewSet(ModelViewSet):
         except ValueError:
             return Response({'error': 'Invalid product id provided'})
 
-        filtered_products = self.queryset.filter(product__id__in=product_ids)
+        filtered_products = self.queryset.filter(
+            product__id__in=product_ids,
+        ).filter(
+            Exists(Inventory.objects.filter(variant=OuterRef('pk'), store_id=store_id))
+        )
+        filtered_products = with_load_plan(filtered_products, ProductVariantSerializer)
         serializer = self.get_serializer(filtered_products, many=True)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class InventoryViewSet(ModelViewSet):
-    queryset = Inventory.objects.select_related('variant__product', 'store').all()
+class InventoryViewSet(FastListMixin, ModelViewSet):
+    # select_related/prefetch_related по сериализатору добавляет FastListMixin
+    queryset = Inventory.objects.all()
     serializer_class = InventorySerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['variant__product__id', 'store__id', 'reserved', 'damaged']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('store_id', 'variant_id')  # Meta.ordering, уникален (unique_together)
 
 
-class ScheduleViewSet(ModelViewSet):
+class ScheduleViewSet(VersionedCacheMixin, ModelViewSet):
     queryset = Schedule.objects.select_related('store__brand').all()
     serializer_class = ScheduleSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['store__id', 'schedule_type', 'weekday', 'is_working']
+    cache_models = (Schedule, Store, Brand)
 
 
-class UnitViewSet(ModelViewSet):
+class UnitViewSet(VersionedCacheMixin, ModelViewSet):
     queryset = Unit.objects.all()
     serializer_class = UnitSerializer
-    pagination_class = None
\ No newline at end of file
+    pagination_class = None
+    cache_models = (Unit,)
+
+
+def cdc_metrics(request):
+    """Метрики синхронизации CDC в текстовом формате Prometheus."""
+    return HttpResponse(REGISTRY.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,6 @@
+def percentile(values, q):
+    """q-й перцентиль (0..100) по ближайшему рангу; для пустого списка — 0.0."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
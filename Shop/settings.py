@@ -161,3 +161,75 @@ REST_FRAMEWORK = {
     'COERCE_DECIMAL_TO_STRING': False,
 
 }
+
+# Режим первичной загрузки CDC: стримы без сохранённого offset'а вставляют снимок (op='r')
+# пачками без проверки внешних ключей до конца снимка
+CDC_BOOTSTRAP = False
+
+# Раз в сколько секунд писать в лог сводку метрик CDC (None — не писать).
+# Те же метрики в формате Prometheus отдаёт /product/metrics/
+CDC_METRICS_LOG_INTERVAL = 60
+
+# Кэш цен и остатков корзины перед SyncedDataFromProduct (Basket/product_cache.py).
+# ENABLED=False — всегда читать из БД. LOCAL_TTL — сколько секунд строка может быть устаревшей.
+# SHARED_ALIAS — алиас общего бэкенда из CACHES (Redis, Memcached); locmem/dummy игнорируются,
+# None — только LRU процесса. SHARED_TTL не может быть больше LOCAL_TTL.
+# Сбрасывается писателем SyncedDataFromProduct через product_data_changed (очередь ProductDataChanged);
+# если писатель её не вызвал, строка устаревает не дольше LOCAL_TTL
+BASKET_PRODUCT_CACHE = {
+    'ENABLED': True,
+    'LOCAL_SIZE': 10000,
+    'LOCAL_TTL': 5,
+    'SHARED_ALIAS': None,
+    'SHARED_TTL': 5,
+}
+
+# Клиент сервиса покупателей (Basket/customer_client.py): таймауты в секундах, размер пула
+# keep-alive соединений, автомат (сбоев подряд / секунд до пробного запроса) и сколько
+# секунд помнить подтверждённого покупателя
+CUSTOMER_SERVICE = {
+    'URL': 'http://customer-container:8001',
+    'CONNECT_TIMEOUT': 0.5,
+    'READ_TIMEOUT': 2.0,
+    'POOL_SIZE': 20,
+    'FAILURE_THRESHOLD': 5,
+    'RESET_TIMEOUT': 30,
+    'CACHE_TTL': 60,
+}
+
+# Архивация неактивных корзин (Basket/archive.py): корзины, неактивные дольше AFTER_DAYS дней,
+# переносятся в архивные таблицы. Запуск — командой archive_baskets по cron или отдельным
+# воркером `manage.py archive_baskets --loop` раз в INTERVAL секунд; веб-процессы её не запускают
+BASKET_ARCHIVE = {
+    'INTERVAL': 3600,
+    'AFTER_DAYS': 30,
+    'BATCH_SIZE': 1000,
+}
+
+# HTTP-кэш справочников каталога (ProductInfo/http_cache.py): версии моделей и данные ответов
+# в кэше ALIAS (для нескольких процессов нужен общий CACHES, иначе версии видны только своему
+# процессу), LOCAL_TTL — сколько секунд процесс помнит версии, RESPONSE_TTL — срок данных ответа
+CATALOG_HTTP_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'LOCAL_TTL': 1,
+    'RESPONSE_TTL': 3600,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # DEBUG печатает каждое сообщение CDC целиком — только для отладки
+        'ProductInfo': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -20,6 +20,7 @@ from django.urls import path, include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('cart/', include('Basket.urls')),
+    path('async/cart/', include('Basket.async_urls')),
     path('product/', include('ProductInfo.urls')),
     path('__debug__/', include('debug_toolbar.urls')),
 ]